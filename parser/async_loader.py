@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# file: async_loader.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# asyncio front end for feeding live streams into a MacroParser
+"""
+Feeds an asynchronous stream of texts (i.e. from a socket) into a
+MacroParser. Requires Python 3.5 or later.
+
+    loader = AsyncLoader(MacroParser(), batch_size = 200,
+                         snapshot_interval = 60, on_snapshot = publish)
+    await loader.run(feed)
+
+Texts are collected into micro-batches, which are parsed in an executor by
+the same worker used for parallel loading in macro_parser. Batches wait in
+a bounded queue: when the parsers fall behind, the queue fills up and the
+loader stops reading from the stream until there is room again.
+"""
+
+import asyncio
+import inspect
+
+from macro_parser import _count_chunk
+
+
+class AsyncLoader():
+    """
+    Loads an async iterator of texts into a MacroParser.
+
+    Arguments:
+        macro               the MacroParser to update. Its
+                            DefaultParserClass and what it is set to
+                            count (CountKeys, NGrams, ...) are used.
+        batch_size          texts per micro-batch.
+        queue_size          batches that may wait to be parsed before the
+                            stream is paused.
+        workers             batches parsed concurrently.
+        executor            a concurrent.futures executor to parse in;
+                            None uses the event loop's default (threads).
+                            Pass a ProcessPoolExecutor to use more than
+                            one core.
+        snapshot_interval   seconds between snapshots, or None for no
+                            periodic snapshots.
+        snapshot_top        tokens per key in a snapshot; None for all.
+        on_snapshot         called with each snapshot; may be a coroutine
+                            function.
+
+    The counters texts and batches record how much has been loaded. A
+    final snapshot is always published when run() finishes, even if the
+    stream or a batch raised.
+    """
+
+    texts       = 0
+    batches     = 0
+
+    def __init__(self, macro, batch_size = 100, queue_size = 4, workers = 1,
+                 executor = None, snapshot_interval = None,
+                 snapshot_top = 10, on_snapshot = None):
+        self.macro              = macro
+        self.batch_size         = batch_size
+        self.queue_size         = queue_size
+        self.workers            = workers
+        self.executor           = executor
+        self.snapshot_interval  = snapshot_interval
+        self.snapshot_top       = snapshot_top
+        self.on_snapshot        = on_snapshot
+
+    async def run(self, texts):
+        """
+        Consume texts, an async iterator, until it is exhausted. Returns
+        the MacroParser.
+        """
+        queue   = asyncio.Queue(self.queue_size)
+        tasks   = [ asyncio.ensure_future(self._produce(texts, queue)) ]
+        tasks  += [ asyncio.ensure_future(self._consume(queue))
+                    for i in range(self.workers) ]
+        ticker  = None
+
+        if self.snapshot_interval:
+            ticker = asyncio.ensure_future(self._tick())
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            pending = [ task for task in tasks + [ ticker ]
+                        if task is not None and not task.done() ]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions = True)
+            await self.publish()
+
+        return self.macro
+
+    async def _produce(self, texts, queue):
+        """
+        Read texts into batches and queue them, then queue one None per
+        worker to tell them to stop.
+        """
+        batch = [ ]
+        async for text in texts:
+            batch.append(text)
+            if len(batch) >= self.batch_size:
+                await queue.put(batch)
+                batch = [ ]
+
+        if batch:
+            await queue.put(batch)
+        for i in range(self.workers):
+            await queue.put(None)
+
+    async def _consume(self, queue):
+        """
+        Parse queued batches in the executor and merge the counts into the
+        MacroParser as they arrive.
+        """
+        loop = asyncio.get_event_loop()
+
+        while True:
+            batch = await queue.get()
+            if batch is None:
+                return
+
+            job     = (self.macro.DefaultParserClass, batch,
+                       self.macro._spec())
+            counts  = await loop.run_in_executor(self.executor, _count_chunk,
+                                                 job)
+            self.macro._merge_counts(counts)
+            self.texts      += len(batch)
+            self.batches    += 1
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            await self.publish()
+
+    def snapshot(self):
+        """
+        Return a dictionary with the number of texts and batches loaded so
+        far and, under 'distributions', each distribution key mapped to
+        its snapshot_top most common (token, count) pairs.
+        """
+        top = self.snapshot_top
+        return { 'texts': self.texts, 'batches': self.batches,
+                 'distributions': dict((key, dist.most_common(top))
+                                       for key, dist
+                                       in self.macro.Distributions.items()) }
+
+    async def publish(self):
+        """
+        Take a snapshot and pass it to on_snapshot, if set.
+        """
+        if self.on_snapshot is None:
+            return
+
+        result = self.on_snapshot(self.snapshot())
+        if inspect.isawaitable(result):
+            await result
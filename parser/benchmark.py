@@ -0,0 +1,573 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# file: benchmark.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# throughput benchmarks for the parsers
+"""
+Simple benchmarks for the parser package. Run from the parser directory:
+
+    python benchmark.py [NAME ...] [-n DOCS] [-m] [--save FILE]
+                        [--compare FILE]
+
+where NAME is one of the keys of BENCHMARKS; with no names, every benchmark
+is run. Each benchmark prints the number of tokens processed, the
+throughput in tokens per second and the peak memory use.
+
+By default the peak is the process high-water mark from getrusage, which
+only ever grows. With -m, each timed run is traced with tracemalloc
+(python 3 only) and the peak allocated during that run is reported
+instead; tracing slows everything down, so compare -m runs only with
+other -m runs.
+
+--save writes the results to FILE as JSON, and --compare prints the change
+in throughput of each result against a file written by --save, so a
+baseline can be recorded before a change and checked after it:
+
+    python benchmark.py -n 5000 --save before.json
+    python benchmark.py -n 5000 --compare before.json
+"""
+
+import bisect
+import json
+import multiprocessing
+import platform
+import random
+import sys
+import time
+
+try:
+    import resource
+except ImportError:                         # not available on windows
+    resource = None
+
+from token_parser import TokenParser
+
+
+# vocabulary used to build tweet-like test documents
+WORDS       = [ 'the', 'market', 'is', 'up', 'today', 'buy', 'sell', 'hold',
+                "it's", "don't", 'wow!', 'really?', 'great,', 'end.',
+                '(maybe)', 'hello...' ]
+SPECIAL     = [ 'http://www.example.com/news', 'www.google.com', ':)', ':-(',
+                '$AAPL', '($GOOG)', 'someone@example.com', '#trading',
+                '@user' ]
+EMOTICONS   = [ ':)', ':(', ':-)', ':-(', ';)', ':D', ':P', '<3', ':/',
+                ':-D' ]
+
+# results of every benchmark run, in order; see report()
+RESULTS     = [ ]
+TRACE       = False                     # set by -m, see timed()
+
+
+def corpus(docs = 1000, length = 20, seed = 0):
+    """
+    Generate a list of docs tweet-like strings of length tokens each. The
+    same seed always produces the same corpus.
+    """
+    rand    = random.Random(seed)
+    texts   = [ ]
+    
+    for i in range(docs):
+        tokens = [ rand.choice(SPECIAL) if rand.random() < 0.2
+                   else rand.choice(WORDS) for j in range(length) ]
+        texts.append(' '.join(tokens))
+    
+    return texts
+
+
+def zipf_vocabulary(size, seed = 0):
+    """
+    Generate size distinct tokens: mostly plain words, with URLs, emails,
+    $TICKERs, hashtags, emoticons and words carrying punctuation mixed in.
+    The first few ranks are always plain words, so the most frequent
+    tokens look like the stopwords of real text.
+    """
+    rand    = random.Random(seed)
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocab   = [ ]
+    
+    for i in range(size):
+        word = ''.join(rand.choice(letters)
+                       for j in range(rand.randint(2, 9))) + str(i)
+        kind = rand.random() if i >= 10 else 1.0
+        if kind < 0.04:
+            word = 'http://www.%s.com/%s' % (word, rand.choice(letters))
+        elif kind < 0.06:
+            word = '%s@%s.com' % (word, rand.choice(letters) * 3)
+        elif kind < 0.09:
+            word = '$' + word[:4].upper()
+        elif kind < 0.12:
+            word = '#' + word
+        elif kind < 0.14:
+            word = rand.choice(EMOTICONS)
+        elif kind < 0.22:
+            word = word + rand.choice([ ',', '.', '!', '?', ';', ':', '...',
+                                        '!!' ])
+        elif kind < 0.25:
+            word = '(%s)' % word
+        vocab.append(word)
+    
+    return vocab
+
+
+def zipf_corpus(docs = 1000, length = 20, vocab = 50000, s = 1.1, seed = 0):
+    """
+    Generate docs texts whose tokens follow a Zipf distribution with
+    exponent s over a vocabulary of vocab tokens.
+    """
+    rand    = random.Random(seed)
+    words   = zipf_vocabulary(vocab, seed)
+    weights = [ ]
+    total   = 0.0
+    
+    for rank in range(1, vocab + 1):
+        total += 1.0 / rank ** s
+        weights.append(total)
+    
+    texts   = [ ]
+    for i in range(docs):
+        tokens = [ words[min(bisect.bisect(weights, rand.random() * total),
+                             vocab - 1)] for j in range(length) ]
+        texts.append(' '.join(tokens))
+    
+    return texts
+
+
+def peak_memory():
+    """
+    Return the peak resident size of the process in bytes, or None if it
+    cannot be found.
+    """
+    if resource is None:
+        return None
+    
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':            # bytes on OS X, KiB elsewhere
+        return peak
+    return peak * 1024
+
+
+def timed(f, *args):
+    """
+    Call f with args, returning (result, elapsed seconds, peak memory in
+    bytes). The peak is the most allocated during the call when TRACE is
+    set, and the process high-water mark otherwise.
+    """
+    if TRACE:
+        import tracemalloc
+        tracemalloc.start()
+    
+    try:
+        start   = time.time()
+        result  = f(*args)
+        elapsed = time.time() - start
+        if TRACE:
+            peak = tracemalloc.get_traced_memory()[1]
+        else:
+            peak = peak_memory()
+    finally:
+        if TRACE:
+            tracemalloc.stop()
+    
+    return result, elapsed, peak
+
+
+def report(name, tokens, elapsed, peak = None):
+    """
+    Print a result and record it in RESULTS. Returns the throughput in
+    tokens per second.
+    """
+    rate    = tokens / max(elapsed, 1e-9)
+    memory  = '%7.1f MiB' % (peak / 1048576.0) if peak else ''
+    print('%-24s %10d tokens %8.3fs %12.0f tokens/sec %s' %
+          (name, tokens, elapsed, rate, memory))
+    RESULTS.append({ 'name': name, 'tokens': tokens, 'seconds': elapsed,
+                     'rate': rate, 'peak': peak })
+    return rate
+
+
+def bench_pipeline(docs = 1000, parser_class = TokenParser):
+    """
+    Time full construction of parser_class over a generated corpus.
+    """
+    texts   = corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    
+    def parse():
+        for text in texts:
+            parser_class(text)
+    
+    result, elapsed, peak = timed(parse)
+    return report('pipeline', tokens, elapsed, peak)
+
+
+def bench_cache(docs = 1000, sizes = (0, 1000, 10000, 100000)):
+    """
+    Parse a Zipf-distributed corpus one TokenParser at a time with the
+    shared token caches disabled and at increasing sizes, reporting the
+    cache hit rates.
+    """
+    texts   = zipf_corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = [ ]
+    default = TokenParser.token_cache_size
+    
+    try:
+        for size in sizes:
+            TokenParser.token_cache_size = size
+            TokenParser._token_caches.pop(TokenParser, None)
+            
+            def parse():
+                for text in texts:
+                    TokenParser(text)
+            
+            result, elapsed, peak = timed(parse)
+            rates.append(report('cache %d' % size, tokens, elapsed, peak))
+            
+            stats = TokenParser.token_cache_stats()
+            for name in sorted(stats or { }):
+                lookups = stats[name]['hits'] + stats[name]['misses']
+                print('    %-8s hit rate %5.1f%%, %d evictions' %
+                      (name, 100.0 * stats[name]['hits'] / max(lookups, 1),
+                       stats[name]['evictions']))
+    finally:
+        TokenParser.token_cache_size = default
+    
+    return rates
+
+
+def bench_batch(docs = 1000, parser_class = TokenParser):
+    """
+    Time parser_class.parse_many over a generated corpus of short texts,
+    where per-text setup is a large part of the cost.
+    """
+    texts   = corpus(docs, length = 8)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    
+    def parse():
+        for p in parser_class.parse_many(texts):
+            pass
+    
+    result, elapsed, peak = timed(parse)
+    return report('batch', tokens, elapsed, peak)
+
+
+def bench_punctuation(docs = 1000, sizes = (1000, 10000, 100000, 1000000)):
+    """
+    Time TokenParser._replace_punctuation over single inputs of increasing
+    size. Linear scaling shows up as a flat tokens/sec column.
+    """
+    parser  = TokenParser('')
+    rates   = [ ]
+    
+    for size in sizes:
+        tokens  = ' '.join(corpus(size // 20 + 1)).split(' ')[:size]
+        result, elapsed, peak = timed(parser._replace_punctuation, tokens)
+        rates.append(report('punctuation %d' % size, size, elapsed, peak))
+    
+    return rates
+
+
+def bench_macro(docs = 1000):
+    """
+    Time importing already-parsed documents into a MacroParser with each
+    of the distribution backends.
+    """
+    from distribution import CompactDistribution, CounterDistribution
+    from macro_parser import MacroParser
+    
+    parsers = list(TokenParser.parse_many(corpus(docs)))
+    tokens  = sum(len(values) for p in parsers
+                  for values in p.TokenDict.values())
+    rates   = [ ]
+    
+    for backend in (CounterDistribution, CompactDistribution):
+        macro   = MacroParser()
+        macro.DistributionClass = backend
+        
+        def load():
+            for p in parsers:
+                macro.import_parser(p)
+        
+        result, elapsed, peak = timed(load)
+        rates.append(report('macro %s' % backend.__name__, tokens, elapsed,
+                            peak))
+    
+    return rates
+
+
+def bench_ngrams(docs = 1000):
+    """
+    Time counting the bigrams and trigrams of clean while loading a
+    Zipf-distributed corpus, with exact counts and with a sketch. Run with
+    -m to compare the memory used.
+    """
+    from macro_parser import MacroParser
+    from sketch import SketchDistribution
+    
+    texts   = zipf_corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = [ ]
+    
+    for backend in (None, SketchDistribution):
+        macro               = MacroParser()
+        macro.CountKeys     = [ ]
+        macro.NGrams        = { 'clean': [ 2, 3 ] }
+        macro.DerivedDistributionClass = backend
+        
+        result, elapsed, peak = timed(macro.load_raw, texts)
+        rates.append(report('ngrams %s' % (backend and backend.__name__
+                                           or 'exact'),
+                            tokens, elapsed, peak))
+    
+    return rates
+
+
+def bench_search(docs = 1000, queries = 100):
+    """
+    Time loading a Zipf-distributed corpus with and without an inverted
+    index on clean, then pairs of words looked up with AND and OR queries
+    and, for comparison, by scanning the parsers. Query rates count the
+    documents searched.
+    """
+    from macro_parser import MacroParser
+    
+    texts   = zipf_corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = [ ]
+    
+    for keys in (None, [ 'clean' ]):
+        macro               = MacroParser()
+        macro.CountKeys     = [ ]
+        macro.IndexKeys     = keys
+        result, elapsed, peak = timed(macro.load_raw, texts)
+        rates.append(report('search load %s' % (keys and 'indexed'
+                                                or 'plain'),
+                            tokens, elapsed, peak))
+    
+    rng     = random.Random(0)
+    pairs   = [ rng.choice(macro.Parsers).TokenDict['clean'][:2]
+                for i in range(queries) ]
+    
+    def search(match_all):
+        for pair in pairs:
+            macro.search('clean', pair, match_all)
+    
+    def scan():
+        for pair in pairs:
+            [ p for p in macro.Parsers
+              if all(token in p.TokenDict['clean'] for token in pair) ]
+    
+    for name, f, args in (('search and', search, (True, )),
+                          ('search or', search, (False, )),
+                          ('search scan', scan, ( ))):
+        result, elapsed, peak = timed(f, *args)
+        rates.append(report(name, docs * queries, elapsed, peak))
+    
+    return rates
+
+
+def bench_parallel(docs = 1000, workers = None):
+    """
+    Time parallel loading into a MacroParser with an increasing number of
+    worker processes, up to the number of CPUs.
+    """
+    from macro_parser import MacroParser
+    
+    texts   = corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = [ ]
+    
+    if not workers:
+        workers = [ 1 ]
+        while workers[-1] * 2 <= multiprocessing.cpu_count():
+            workers.append(workers[-1] * 2)
+    
+    for n in workers:
+        macro   = MacroParser()
+        result, elapsed, peak = timed(macro._load_parallel, texts, n,
+                                      max(docs // (n * 4), 1))
+        rates.append(report('parallel %d' % n, tokens, elapsed, peak))
+    
+    return rates
+
+
+def bench_spans(docs = 1000, parser_class = TokenParser):
+    """
+    Parse and keep a Zipf-distributed corpus with and without span mode.
+    Run with -m to compare the memory the parsers hold on to.
+    """
+    from tokenizer import Tokenizer
+    
+    texts   = zipf_corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = [ ]
+    default = (parser_class.tokenizer, parser_class.span_mode)
+    
+    try:
+        parser_class.tokenizer = Tokenizer()
+        for span_mode in (False, True):
+            parser_class.span_mode = span_mode
+            
+            def parse():
+                return list(parser_class.parse_many(texts))
+            
+            result, elapsed, peak = timed(parse)
+            rates.append(report('spans %s' % ('on' if span_mode else 'off'),
+                                tokens, elapsed, peak))
+    finally:
+        parser_class.tokenizer, parser_class.span_mode = default
+    
+    return rates
+
+
+def bench_stages(docs = 1000, parser_class = TokenParser, texts = None,
+                 label = 'stage'):
+    """
+    Time each stage of the pipeline separately over a Zipf-distributed
+    corpus: setting up the parsers, the pre_tparse pass that fills
+    special, the sparse pass that fills sent, the clean pass and importing
+    the results into a MacroParser. The parsers are created in lazy mode
+    and each stage is forced for every parser in turn, so the stages are
+    timed in bulk rather than per text.
+    """
+    from macro_parser import MacroParser
+    
+    if texts is None:
+        texts   = zipf_corpus(docs)
+    tokens  = sum(len(text.split(' ')) for text in texts)
+    rates   = { }
+    
+    def setup():
+        return [ parser_class(text, lazy = True) for text in texts ]
+    
+    parsers, elapsed, peak = timed(setup)
+    rates['setup'] = report('%s setup' % label, tokens, elapsed, peak)
+    
+    for stage, key in (('pre_tparse', 'special'), ('sparse', 'sent'),
+                       ('clean', 'clean')):
+        def build():
+            for p in parsers:
+                p.TokenDict[key]
+        
+        result, elapsed, peak = timed(build)
+        rates[stage] = report('%s %s' % (label, stage), tokens, elapsed,
+                              peak)
+    
+    for p in parsers:                       # any keys from derived classes
+        p.TokenDict.materialize()
+    
+    macro   = MacroParser()
+    
+    def load():
+        for p in parsers:
+            macro.import_parser(p)
+    
+    result, elapsed, peak = timed(load)
+    rates['import'] = report('%s import' % label, tokens, elapsed, peak)
+    return rates
+
+
+def bench_scaling(docs = 1000, steps = 4, parser_class = TokenParser):
+    """
+    Run bench_stages over corpora that double in size up to docs texts,
+    from the same Zipf distribution. Linear scaling shows up as a flat
+    tokens/sec column for each stage.
+    """
+    texts   = zipf_corpus(docs)
+    curves  = [ ]
+    
+    for step in reversed(range(steps)):
+        size = max(docs >> step, 1)
+        curves.append((size, bench_stages(parser_class = parser_class,
+                                          texts = texts[:size],
+                                          label = 'scaling %d' % size)))
+    
+    return curves
+
+
+BENCHMARKS  = {
+    'batch':        bench_batch,
+    'cache':        bench_cache,
+    'macro':        bench_macro,
+    'ngrams':       bench_ngrams,
+    'parallel':     bench_parallel,
+    'pipeline':     bench_pipeline,
+    'punctuation':  bench_punctuation,
+    'scaling':      bench_scaling,
+    'search':       bench_search,
+    'spans':        bench_spans,
+    'stages':       bench_stages,
+}
+
+
+def save_results(path, docs):
+    """
+    Write RESULTS to path as JSON, along with enough about the run to tell
+    whether two result files are comparable.
+    """
+    with open(path, 'w') as f:
+        json.dump({ 'docs': docs, 'traced': TRACE,
+                    'python': platform.python_version(),
+                    'results': RESULTS }, f, indent = 1, sort_keys = True)
+
+
+def compare_results(path, docs):
+    """
+    Print the change in throughput of each result in RESULTS against the
+    result of the same name in the baseline saved at path.
+    """
+    with open(path) as f:
+        baseline = json.load(f)
+    
+    if baseline['docs'] != docs or baseline['traced'] != TRACE:
+        print('warning: baseline was run with -n %d%s' %
+              (baseline['docs'], ' -m' if baseline['traced'] else ''))
+    
+    before  = dict((result['name'], result)
+                   for result in baseline['results'])
+    print('\n%-24s %12s %12s %8s' % ('benchmark', 'baseline', 'current',
+                                      'change'))
+    for result in RESULTS:
+        old = before.get(result['name'])
+        if old is None:
+            print('%-24s %12s %12.0f' % (result['name'], '-',
+                                         result['rate']))
+        else:
+            print('%-24s %12.0f %12.0f %+7.1f%%' %
+                  (result['name'], old['rate'], result['rate'],
+                   100.0 * (result['rate'] / max(old['rate'], 1e-9) - 1)))
+
+
+def main(args):
+    global TRACE
+    docs    = 1000
+    names   = [ ]
+    save    = None
+    compare = None
+    
+    while args:
+        arg = args.pop(0)
+        if arg == '-n':
+            docs = int(args.pop(0))
+        elif arg == '-m':
+            TRACE = True
+        elif arg == '--save':
+            save = args.pop(0)
+        elif arg == '--compare':
+            compare = args.pop(0)
+        else:
+            names.append(arg)
+    
+    for name in names or sorted(BENCHMARKS):
+        BENCHMARKS[name](docs)
+    
+    if save:
+        save_results(save, docs)
+    if compare:
+        compare_results(compare, docs)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+# file: classifier.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# single-pass regex token classifier
+"""
+Compiles a dictionary of named regexes (i.e. TokenParser.regex) into a
+single matcher that tags a token with every class it belongs to in one
+call to match().
+"""
+
+import re
+
+try:
+    from re import _parser as sre_parse     # python 3.11 and later
+except ImportError:
+    import sre_parse
+
+# parsed opcodes that refer back to a group by number or name
+REFERENCES  = (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS)
+
+
+def _has_references(node):
+    """
+    Return True if node, a pattern parsed by sre_parse or a piece of one,
+    contains a backreference or a conditional group.
+    """
+    if isinstance(node, sre_parse.SubPattern):
+        return any(op in REFERENCES or _has_references(av)
+                   for op, av in node)
+    if isinstance(node, (list, tuple)):
+        return any(_has_references(item) for item in node)
+    return False
+
+
+class Classifier():
+    """
+    Each regex is wrapped in an optional lookahead with its own named
+    group, and the lookaheads are joined into one pattern:
+
+        (?:(?=(?P<_c0>url regex))|)(?:(?=(?P<_c1>email regex))|)...
+
+    Since every lookahead is anchored at the start of the token, a group
+    participates in the match exactly when re.match() on that regex alone
+    would have succeeded. Regexes that need different flags are put into
+    separate combined patterns, so a token costs one match() per distinct
+    set of flags.
+
+    Wrapping a regex renumbers its groups, so a regex with a backreference
+    or a conditional group would refer to the wrong group once combined.
+    Those regexes are matched on their own instead.
+
+    Attributes:
+        patterns:   dictionary of every regex, compiled individually.
+        classes:    list of the class names the classifier tags with.
+
+    classify(token) returns a frozenset of the class names that match.
+    """
+
+    patterns    = None
+    classes     = None
+
+    def __init__(self, regex, flags = None, exclude = None):
+        """
+        regex is a dictionary of class name to regex string. flags may map
+        a class name to additional re flags (re.U is always set). Names in
+        exclude are compiled into patterns but not used for tagging.
+        """
+        flags           = flags or { }
+        exclude         = exclude or [ ]
+
+        self.patterns   = { }
+        self.classes    = [ ]
+        self._matchers  = [ ]
+        self._tagsets   = { }
+
+        groups          = { }
+        for name in sorted(regex):
+            f = re.U | flags.get(name, 0)
+            self.patterns[name] = re.compile(regex[name], f)
+            if not name in exclude:
+                self.classes.append(name)
+                groups.setdefault(f, [ ]).append(name)
+
+        for f in sorted(groups):
+            self._matchers.extend(self._combine(regex, groups[f], f))
+
+    def _combine(self, regex, names, flags):
+        """
+        Build the matchers for names, returning a list of tuples of a
+        pattern and a list of (name, offset into match.groups()) pairs.
+        Regexes that refer back to their own groups are returned with a
+        pattern of None, meaning each is matched on its own; so are all of
+        them if they cannot be combined (i.e. two of them define the same
+        named group).
+        """
+        alone       = [ name for name in names
+                        if _has_references(sre_parse.parse(regex[name],
+                                                           flags)) ]
+        names       = [ name for name in names if not name in alone ]
+        matchers    = [ ]
+        if alone:
+            matchers.append((None, [ (name, None) for name in alone ]))
+        if not names:
+            return matchers
+
+        alternation = ''.join('(?:(?=(?P<_c%d>%s))|)' % (i, regex[name])
+                              for i, name in enumerate(names))
+        try:
+            pattern = re.compile(alternation, flags)
+        except re.error:
+            return matchers + [ (None, [ (name, None) for name in names ]) ]
+
+        return matchers + [ (pattern,
+                             [ (name, pattern.groupindex['_c%d' % i] - 1)
+                               for i, name in enumerate(names) ]) ]
+
+    def classify(self, token):
+        """
+        Return the frozenset of class names whose regex matches token.
+        """
+        tags = [ ]
+        for pattern, names in self._matchers:
+            if pattern is None:
+                for name, i in names:
+                    if self.patterns[name].match(token): tags.append(name)
+                continue
+
+            groups = pattern.match(token).groups()
+            for name, i in names:
+                if groups[i] is not None: tags.append(name)
+
+        tags = tuple(tags)
+        try:                            # share one frozenset per tag set
+            return self._tagsets[tags]
+        except KeyError:
+            tagset = self._tagsets[tags] = frozenset(tags)
+            return tagset
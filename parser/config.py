@@ -26,3 +26,14 @@ class internal_config():
     
     hook_priority           = None      # set to false to have hooks run
                                         # after generic processors
+
+    # options for the clean pass; all are applied in the same pass over
+    # the sentence.
+    clean_casefold          = None      # full Unicode case-folding rather
+                                        # than lower() (python 3 only)
+    clean_normalize         = None      # unicodedata normal form to apply
+                                        # to unicode tokens, i.e. 'NFKC';
+                                        # applied before the sentence pass,
+                                        # so sent is normalized too
+    clean_stopwords         = None      # cleaned tokens to drop; any
+                                        # iterable, kept as a frozenset
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# file: distribution.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# token count storage for MacroParser
+"""
+Frequency distribution backends for MacroParser. A backend counts tokens
+in bulk and can export its counts as an NLTK FreqDist; NLTK is only
+imported when a FreqDist is actually asked for.
+"""
+
+import heapq
+from array import array
+from collections import Counter
+
+
+class Distribution():
+    """
+    Base class for the distribution backends. Derived classes provide:
+        update(tokens)          -   count each token in an iterable.
+        add_counts(counts)      -   add a {token: count} mapping.
+        count(token)            -   the count for token (0 if unseen).
+        items()                 -   iterator of (token, count) pairs.
+        __len__()               -   the number of distinct tokens.
+
+    The base class provides total(), most_common(n), merge(other), which
+    adds the counts of another distribution, and freqdist(n), which
+    returns the counts as a new nltk.FreqDist. A backend that cannot be
+    counted into sets read_only.
+    """
+
+    read_only   = False
+
+    def total(self):
+        return sum(count for token, count in self.items())
+
+    def most_common(self, n = None):
+        """
+        Return a list of the n most common (token, count) pairs, or all of
+        them if n is None, most common first.
+        """
+        if n is None:
+            return sorted(self.items(), key = lambda item: -item[1])
+        return heapq.nlargest(n, self.items(), key = lambda item: item[1])
+
+    def merge(self, other):
+        """
+        Add the counts of other, a distribution of any kind.
+        """
+        self.add_counts(dict(other.items()))
+    
+    def freqdist(self, n = None):
+        """
+        Export the counts as an nltk.FreqDist, or only the n most common if
+        n is not None.
+        """
+        from nltk import FreqDist
+        if n is None:
+            return FreqDist(dict(self.items()))
+        return FreqDist(dict(self.most_common(n)))
+
+
+class CounterDistribution(Distribution):
+    """
+    The default backend: a collections.Counter updated a token list at a
+    time.
+    """
+
+    def __init__(self):
+        self._counts    = Counter()
+
+    def update(self, tokens):
+        self._counts.update(tokens)
+
+    def add_counts(self, counts):
+        self._counts.update(counts)
+    
+    def remove_counts(self, counts):
+        """
+        Subtract a {token: count} mapping, forgetting tokens whose count
+        falls to zero.
+        """
+        current = self._counts
+        for token, count in counts.items():
+            left = current[token] - count
+            if left > 0:
+                current[token] = left
+            else:
+                current.pop(token, None)
+
+    def count(self, token):
+        return self._counts[token]
+
+    def items(self):
+        return iter(self._counts.items())
+
+    def most_common(self, n = None):
+        return self._counts.most_common(n)
+
+    def __len__(self):
+        return len(self._counts)
+
+
+def _typecode(size):
+    """
+    Return the typecode of the narrowest unsigned array type of at least
+    size bytes.
+    """
+    for code in 'BHILQ':
+        try:
+            if array(code).itemsize >= size:
+                return code
+        except ValueError:                  # no 'Q' before python 3.3
+            pass
+    raise ValueError('no %d byte array type' % size)
+
+
+NARROW      = _typecode(4)
+WIDE        = _typecode(8)                  # 64 bits, even on windows
+
+
+class CompactDistribution(Distribution):
+    """
+    A memory-compact backend that keeps no Python object per token. The
+    distinct tokens are appended, utf-8 encoded, to one bytearray; the
+    offset of each token in it and its count are kept in arrays indexed
+    by the token's id, and tokens are found through an open-addressing
+    hash table of ids. A distinct token costs its length plus about 20
+    bytes, where a Counter keeps the token string alive (some 50 bytes
+    more than its length) and spends about as much again on its entry and
+    count. The price is slower updates, as each token is encoded and
+    looked up in Python.
+
+    The offsets and counts start out 32 bits wide and are widened to 64
+    bits, on every platform, if a value outgrows them. Tokens are
+    returned as unicode strings, as from a MappedDistribution.
+    """
+
+    def __init__(self):
+        self._blob      = bytearray()       # the tokens, end to end
+        self._offsets   = array(NARROW, [ 0 ])  # id -> start, id + 1 -> end
+        self._counts    = array(NARROW)     # id -> count
+        self._table     = array('I', [ 0 ]) * 8 # id + 1 per slot, 0 if free
+
+    def _token(self, i):
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]])
+
+    def _find(self, data, add = False):
+        """
+        Return the id of data, a utf-8 encoded token. A token that is not
+        present is added if add is set, and otherwise None is returned.
+        """
+        table   = self._table
+        mask    = len(table) - 1
+        slot    = hash(data) & mask
+        blob    = self._blob
+        offsets = self._offsets
+
+        size    = len(data)
+        while table[slot]:
+            i       = table[slot] - 1
+            start   = offsets[i]
+            if offsets[i + 1] - start == size and blob.startswith(data, start):
+                return i
+            slot    = (slot + 1) & mask
+
+        if not add:
+            return None
+
+        i = len(self._counts)
+        table[slot] = i + 1
+        blob.extend(data)
+        if len(blob) >> (8 * offsets.itemsize):
+            offsets = self._offsets = array(WIDE, offsets)
+        offsets.append(len(blob))
+        self._counts.append(0)
+        if 3 * (i + 1) > 2 * len(table):
+            self._rehash(2 * len(table))
+        return i
+
+    def _rehash(self, size):
+        """
+        Rebuild the hash table with size slots, a power of two.
+        """
+        table   = array('I', [ 0 ]) * size
+        mask    = size - 1
+        for i in range(len(self._counts)):
+            slot = hash(self._token(i)) & mask
+            while table[slot]:
+                slot = (slot + 1) & mask
+            table[slot] = i + 1
+        self._table = table
+
+    def update(self, tokens):
+        self.add_counts(Counter(tokens))
+
+    def add_counts(self, counts):
+        for token, count in counts.items():
+            if not isinstance(token, bytes):
+                token = token.encode('utf-8')
+            i = self._find(token, True)
+            try:
+                self._counts[i] += count
+            except OverflowError:
+                self._counts = array(WIDE, self._counts)
+                self._counts[i] += count
+
+    def count(self, token):
+        if not isinstance(token, bytes):
+            token = token.encode('utf-8')
+        i = self._find(token)
+        if i is None:
+            return 0
+        return self._counts[i]
+
+    def items(self):
+        return ((self._token(i).decode('utf-8'), count)
+                for i, count in enumerate(self._counts))
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __getstate__(self):
+        # string hashes differ between processes, so the table is rebuilt
+        # when a pickled distribution is loaded.
+        state = self.__dict__.copy()
+        del state['_table']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        size = 8
+        while 2 * size < 3 * len(self._counts):
+            size *= 2
+        self._rehash(size)
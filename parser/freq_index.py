@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+# file: freq_index.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# on-disk storage for MacroParser distributions
+"""
+Saves a set of named distributions to a single file and loads them back
+through mmap, so that a process can look up counts and the most common
+tokens without reading the whole file.
+
+File layout (all integers are little-endian):
+    magic       8 bytes, 'BNLPIDX2'
+    nkeys       uint32
+    directory   nkeys entries of:
+                    name length (uint16), name (utf-8), section offset
+                    (uint64)
+    sections    one per key:
+                    n           uint64, number of distinct tokens
+                    sizes       3 uint8, the size in bytes (4 or 8) of
+                                the integers in offsets, counts and rank
+                    offsets     n + 1 integers, token boundaries in blob
+                    counts      n integers, in vocabulary order
+                    rank        n integers, token ids by descending count
+                    blob        the utf-8 tokens in sorted byte order
+
+Each table is written as uint32s unless a value in it needs more bits,
+in which case that table alone is written as uint64s. Tokens are looked
+up by binary search over the sorted vocabulary, and most_common(n) only
+reads the first n entries of the rank table.
+"""
+
+import heapq
+import mmap
+import struct
+
+from distribution import Distribution
+
+
+MAGIC       = b'BNLPIDX2'
+CHUNK       = 4096                      # integers packed or unpacked at once
+FORMATS     = { 4: 'I', 8: 'Q' }        # struct format by integer size
+
+
+def _encode(token):
+    if isinstance(token, bytes):
+        return token
+    return token.encode('utf-8')
+
+
+def _size(values):
+    """
+    Return the size in bytes of the integers to write values as: 4 if
+    they all fit in a uint32, and 8 otherwise.
+    """
+    if values and max(values) >> 32:
+        return 8
+    return 4
+
+
+def _write_ints(f, values, size):
+    """
+    Write a sequence of integers as integers of size bytes, CHUNK at a
+    time.
+    """
+    for i in range(0, len(values), CHUNK):
+        chunk = values[i:i + CHUNK]
+        f.write(struct.pack('<%d%s' % (len(chunk), FORMATS[size]), *chunk))
+
+
+def _write_section(f, entries):
+    """
+    Write one distribution, given as a list of (utf-8 token, count) pairs
+    sorted by token.
+    """
+    n       = len(entries)
+    offsets = [ 0 ]
+    for token, count in entries:
+        offsets.append(offsets[-1] + len(token))
+    counts  = [ count for token, count in entries ]
+    rank    = sorted(range(n), key = lambda i: -counts[i])
+
+    tables  = (offsets, counts, rank)
+    sizes   = [ _size(table) for table in tables ]
+
+    f.write(struct.pack('<QBBB', n, *sizes))
+    for table, size in zip(tables, sizes):
+        _write_ints(f, table, size)
+    for token, count in entries:
+        f.write(token)
+
+
+def _write_index(path, sections):
+    """
+    Write an index file from a list of (key, entries) pairs, where entries
+    is as for _write_section.
+    """
+    names   = [ key.encode('utf-8') for key, entries in sections ]
+    start   = len(MAGIC) + 4 + sum(2 + len(name) + 8 for name in names)
+    where   = [ ]
+
+    with open(path, 'wb') as f:
+        f.seek(start)
+        for key, entries in sections:
+            where.append(f.tell())
+            _write_section(f, entries)
+
+        f.seek(0)
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(names)))
+        for name, offset in zip(names, where):
+            f.write(struct.pack('<H', len(name)))
+            f.write(name)
+            f.write(struct.pack('<Q', offset))
+
+
+def save_index(path, distributions):
+    """
+    Save distributions, a list of (key, Distribution) pairs, to path.
+    """
+    _write_index(path, [ (key, sorted((_encode(token), count)
+                                      for token, count in dist.items()))
+                         for key, dist in distributions ])
+
+
+def load_index(path):
+    """
+    Memory-map the index at path, returning a list of (key,
+    MappedDistribution) pairs in the order they were saved.
+    """
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+
+    if mm[:len(MAGIC)] != MAGIC:
+        raise ValueError('%s is not a frequency index' % path)
+
+    pos             = len(MAGIC)
+    nkeys,          = struct.unpack_from('<I', mm, pos)
+    pos            += 4
+    distributions   = [ ]
+
+    for i in range(nkeys):
+        length,     = struct.unpack_from('<H', mm, pos)
+        key         = mm[pos + 2:pos + 2 + length].decode('utf-8')
+        offset,     = struct.unpack_from('<Q', mm, pos + 2 + length)
+        pos        += 2 + length + 8
+        distributions.append((key, MappedDistribution(mm, offset)))
+
+    return distributions
+
+
+def merge_index(path, shards):
+    """
+    Merge the index files listed in shards into a single index at path,
+    summing the counts of tokens that appear in more than one shard.
+    """
+    keys    = [ ]
+    loaded  = { }
+    for shard in shards:
+        for key, dist in load_index(shard):
+            if not key in loaded:
+                keys.append(key)
+                loaded[key] = [ ]
+            loaded[key].append(dist)
+
+    sections = [ ]
+    for key in keys:
+        entries = [ ]
+        for token, count in heapq.merge(*[ dist._entries()
+                                            for dist in loaded[key] ]):
+            if entries and entries[-1][0] == token:
+                entries[-1] = (token, entries[-1][1] + count)
+            else:
+                entries.append((token, count))
+        sections.append((key, entries))
+
+    _write_index(path, sections)
+
+
+class MappedDistribution(Distribution):
+    """
+    A read-only distribution backed by one section of a memory-mapped
+    index file. Tokens are returned as unicode strings.
+    """
+
+    read_only   = True
+
+    def __init__(self, mm, offset):
+        self._mm        = mm
+        n, osize, csize, rsize = struct.unpack_from('<QBBB', mm, offset)
+        self._n         = n
+
+        # each table is (position, integer size, struct format)
+        self._offsets   = (offset + 11, osize, FORMATS[osize])
+        self._counts    = (self._offsets[0] + osize * (n + 1), csize,
+                           FORMATS[csize])
+        self._rank      = (self._counts[0] + csize * n, rsize,
+                           FORMATS[rsize])
+        self._blob      = self._rank[0] + rsize * n
+
+    def _int(self, table, i):
+        return self._ints(table, i, i + 1)[0]
+
+    def _ints(self, table, start, stop):
+        pos, size, code = table
+        return struct.unpack_from('<%d%s' % (stop - start, code), self._mm,
+                                  pos + size * start)
+
+    def _token(self, i):
+        start, stop = self._ints(self._offsets, i, i + 2)
+        return self._mm[self._blob + start:self._blob + stop]
+
+    def _find(self, token):
+        """
+        Return the id of token by binary search, or None if not present.
+        """
+        token   = _encode(token)
+        lo, hi  = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._token(mid) < token:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        if lo < self._n and self._token(lo) == token:
+            return lo
+        return None
+
+    def _entries(self):
+        """
+        Iterate over (utf-8 token, count) pairs in sorted token order.
+        """
+        for start in range(0, self._n, CHUNK):
+            stop    = min(start + CHUNK, self._n)
+            offsets = self._ints(self._offsets, start, stop + 1)
+            counts  = self._ints(self._counts, start, stop)
+            for i in range(stop - start):
+                yield (self._mm[self._blob + offsets[i]:
+                                self._blob + offsets[i + 1]], counts[i])
+
+    def update(self, tokens):
+        raise TypeError('MappedDistribution is read-only')
+
+    def add_counts(self, counts):
+        raise TypeError('MappedDistribution is read-only')
+
+    def count(self, token):
+        i = self._find(token)
+        if i is None:
+            return 0
+        return self._int(self._counts, i)
+
+    def items(self):
+        return ((token.decode('utf-8'), count)
+                for token, count in self._entries())
+
+    def most_common(self, n = None):
+        if n is None or n > self._n:
+            n = self._n
+
+        common = [ ]
+        for start in range(0, n, CHUNK):
+            for i in self._ints(self._rank, start, min(start + CHUNK, n)):
+                common.append((self._token(i).decode('utf-8'),
+                               self._int(self._counts, i)))
+        return common
+
+    def __len__(self):
+        return self._n
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+# file: inverted_index.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# token -> document posting lists for keyword search
+"""
+An inverted index from tokens to the ids of the documents containing
+them, built one document at a time, for keyword search over a MacroParser
+without scanning its parsers:
+
+    index = InvertedIndex()
+    index.add(0, [ 'buy', '$aapl' ])
+    index.add(1, [ 'sell', '$aapl' ])
+    index.intersect([ 'buy', '$aapl' ])       # [ 0 ]
+    index.union([ 'buy', 'sell' ])            # [ 0, 1 ]
+
+Each posting list is kept as an array of the gaps between successive
+document ids. The array uses the narrowest item size that holds the
+largest gap and is only widened when a larger gap comes along, so a
+common token, whose gaps are small, costs a byte per document. Decoding
+is a running sum done by itertools.accumulate, which runs in C.
+
+Every BLOCK gaps, a posting list also keeps the id the block starts at.
+These skip pointers let an intersection look documents up in a long list
+by bisecting the block starts and decoding only the blocks the documents
+fall in, rather than decoding the whole list. They are not saved; a
+loaded list rebuilds them from its gaps.
+
+save_postings and load_postings write and read a set of named indexes;
+the file layout (all integers little-endian) is:
+    magic       8 bytes, 'BNLPINV1'
+    nkeys       uint32
+    indexes     nkeys entries of:
+                    name length (uint16), name (utf-8), docs (uint64),
+                    nterms (uint64), then nterms postings of:
+                        token length (uint32), token (utf-8), item size
+                        (uint8), ngaps (uint64), the gaps
+"""
+
+import bisect
+import struct
+import sys
+from array import array
+from itertools import chain
+
+try:
+    from itertools import accumulate
+except ImportError:                         # python 2
+    def accumulate(values):
+        total = 0
+        for value in values:
+            total += value
+            yield total
+
+
+MAGIC       = b'BNLPINV1'
+BLOCK       = 128                           # gaps per skip pointer
+
+
+def _widths():
+    """
+    Return an array typecode for each item size, narrowest first.
+    """
+    widths = { }
+    for code in 'LIHB':
+        widths[array(code).itemsize] = code
+    return [ widths[size] for size in sorted(widths) ]
+
+
+WIDTHS      = _widths()
+
+
+def _tobytes(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return getattr(values, 'tobytes', getattr(values, 'tostring', None))()
+
+
+def _frombytes(code, data):
+    values = array(code)
+    getattr(values, 'frombytes', getattr(values, 'fromstring', None))(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+class PostingList():
+    """
+    The ids of the documents containing a token, in increasing order,
+    stored as gaps: the first entry is the first id and each later entry
+    is the difference from the one before. Iterating over a PostingList
+    yields the ids.
+
+    starts holds the id at the start of each block of BLOCK gaps, so that
+    block i decodes from starts[i] and gaps[i * BLOCK + 1:(i + 1) * BLOCK]
+    alone.
+    """
+
+    last        = None                      # the last id appended
+
+    def __init__(self, gaps = None):
+        if gaps is None:
+            gaps = array(WIDTHS[0])
+        self.gaps   = gaps
+        self.starts = [ ]
+        if gaps:
+            ids         = list(accumulate(gaps))
+            self.starts = ids[::BLOCK]
+            self.last   = ids[-1]
+
+    def append(self, doc):
+        """
+        Append doc, which must be greater than the last id appended.
+        """
+        if self.last is None:
+            gap = doc
+        else:
+            gap = doc - self.last
+            if gap <= 0:
+                raise ValueError('document ids must increase')
+
+        if gap >> (8 * self.gaps.itemsize):
+            self._widen(gap)
+        if not len(self.gaps) % BLOCK:
+            self.starts.append(doc)
+        self.gaps.append(gap)
+        self.last = doc
+
+    def _widen(self, gap):
+        for code in WIDTHS:
+            if not gap >> (8 * array(code).itemsize):
+                self.gaps = array(code, self.gaps)
+                return
+        raise OverflowError('document id too large')
+
+    def _block(self, i):
+        """
+        Return the ids in block i.
+        """
+        start = i * BLOCK
+        return list(accumulate(chain((self.starts[i], ),
+                                     self.gaps[start + 1:start + BLOCK])))
+
+    def filter(self, docs):
+        """
+        Return a list of the ids in docs, a list or PostingList in
+        increasing order, that are also in this list. When docs is short
+        next to this list, each id is found by its skip pointer and only
+        the blocks holding docs are decoded; otherwise the list is decoded
+        in full.
+        """
+        starts = self.starts
+        if len(docs) > len(starts):
+            return sorted(set(docs).intersection(self))
+
+        matches = [ ]
+        current = ids = None
+        for doc in docs:
+            i = bisect.bisect_right(starts, doc) - 1
+            if i < 0:
+                continue
+            if i != current:
+                current, ids = i, self._block(i)
+            j = bisect.bisect_left(ids, doc)
+            if j < len(ids) and ids[j] == doc:
+                matches.append(doc)
+        return matches
+
+    def __len__(self):
+        return len(self.gaps)
+
+    def __iter__(self):
+        return accumulate(self.gaps)
+
+
+class InvertedIndex():
+    """
+    Maps each token to the PostingList of the documents it occurs in.
+    Documents are added with add(doc, tokens) in increasing order of id;
+    docs is the number added.
+
+    Queries return lists of document ids in increasing order:
+        get(token)              -   the documents containing token.
+        intersect(tokens)       -   the documents containing all of
+                                    tokens (AND).
+        union(tokens)           -   the documents containing any of
+                                    tokens (OR).
+        count(token)            -   the number of documents containing
+                                    token.
+
+    An intersection decodes only the shortest posting list, checks its
+    documents against each longer list in turn with PostingList.filter
+    and stops as soon as none are left, so a query with a rare token only
+    decodes the blocks of the common tokens' lists that could hold its
+    documents.
+    """
+
+    docs        = 0
+
+    def __init__(self):
+        self.postings   = { }               # token -> PostingList
+
+    def add(self, doc, tokens):
+        """
+        Index document doc as containing each of tokens.
+        """
+        postings = self.postings
+        for token in set(tokens):
+            if not token in postings:
+                postings[token] = PostingList()
+            postings[token].append(doc)
+        self.docs += 1
+
+    def get(self, token):
+        if not token in self.postings:
+            return [ ]
+        return list(self.postings[token])
+
+    def count(self, token):
+        if not token in self.postings:
+            return 0
+        return len(self.postings[token])
+
+    def intersect(self, tokens):
+        lists = [ self.postings.get(token) for token in set(tokens) ]
+        if not lists or None in lists:
+            return [ ]
+
+        lists.sort(key = len)
+        docs = lists[0]
+        for postings in lists[1:]:
+            docs = postings.filter(docs)
+            if not docs:
+                break
+        return list(docs)
+
+    def union(self, tokens):
+        docs = set( )
+        for token in set(tokens):
+            if token in self.postings:
+                docs.update(self.postings[token])
+        return sorted(docs)
+
+    def __contains__(self, token):
+        return token in self.postings
+
+    def __len__(self):
+        return len(self.postings)
+
+
+def save_postings(path, indexes):
+    """
+    Save indexes, a list of (key, InvertedIndex) pairs, to path.
+    """
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(indexes)))
+        for key, index in indexes:
+            name = key.encode('utf-8')
+            f.write(struct.pack('<H', len(name)))
+            f.write(name)
+            f.write(struct.pack('<QQ', index.docs, len(index.postings)))
+
+            for token, postings in sorted(index.postings.items()):
+                if not isinstance(token, bytes):
+                    token = token.encode('utf-8')
+                gaps = postings.gaps
+                f.write(struct.pack('<I', len(token)))
+                f.write(token)
+                f.write(struct.pack('<BQ', gaps.itemsize, len(gaps)))
+                f.write(_tobytes(gaps))
+
+
+def load_postings(path):
+    """
+    Load the indexes saved at path, returning a list of (key,
+    InvertedIndex) pairs in the order they were saved.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError('%s is not a posting index' % path)
+
+    codes   = dict((array(code).itemsize, code) for code in WIDTHS)
+    pos     = len(MAGIC)
+    nkeys,  = struct.unpack_from('<I', data, pos)
+    pos    += 4
+    indexes = [ ]
+
+    for i in range(nkeys):
+        length, = struct.unpack_from('<H', data, pos)
+        key     = data[pos + 2:pos + 2 + length].decode('utf-8')
+        pos    += 2 + length
+
+        index   = InvertedIndex()
+        index.docs, nterms = struct.unpack_from('<QQ', data, pos)
+        pos    += 16
+
+        for j in range(nterms):
+            length, = struct.unpack_from('<I', data, pos)
+            token   = data[pos + 4:pos + 4 + length].decode('utf-8')
+            pos    += 4 + length
+
+            size, ngaps = struct.unpack_from('<BQ', data, pos)
+            pos    += 9
+            gaps    = _frombytes(codes[size], data[pos:pos + size * ngaps])
+            pos    += size * ngaps
+            index.postings[token] = PostingList(gaps)
+
+        indexes.append((key, index))
+
+    return indexes
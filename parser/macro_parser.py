@@ -6,8 +6,101 @@
 #
 # collections of TokenParsers
 
+import hashlib
+import io
+import itertools
+import multiprocessing
+
+from collections import Counter, deque
+
+from distribution import CounterDistribution
+from freq_index import load_index, save_index
+from inverted_index import InvertedIndex, load_postings, save_postings
+from sketch import SketchDistribution
 from token_parser import TokenParser
-from nltk import FreqDist
+
+
+def _keys(p, count_keys):
+    """
+    Return the keys of parser p's TokenDict to count: all of them, or 
+    those in count_keys if it is not None.
+    """
+    if count_keys is None:
+        return p.TokenDict.keys()
+    return [ key for key in count_keys if key in p.TokenDict ]
+
+
+def _ngrams(tokens, n):
+    """
+    Return the n-grams of a token list as strings of n space-separated
+    tokens.
+    """
+    tokens = list(tokens)
+    return [ ' '.join(gram) for gram
+             in zip(*[ tokens[i:] for i in range(n) ]) ]
+
+
+def _pairs(tokens, limit):
+    """
+    Return each unordered pair of distinct tokens as a string of the two
+    tokens in sorted order, separated by a space. Only the first limit
+    distinct tokens are paired.
+    """
+    distinct    = [ ]
+    seen        = set( )
+    for token in tokens:
+        if not token in seen:
+            seen.add(token)
+            distinct.append(token)
+    
+    distinct    = sorted(distinct[:limit])
+    return [ '%s %s' % (a, b) for i, a in enumerate(distinct)
+             for b in distinct[i + 1:] ]
+
+
+def _counted(p, spec):
+    """
+    Return the (distribution key, tokens) pairs to count for parser p. 
+    spec is a (count_keys, ngrams, cooccurrence, pair_limit) tuple, as 
+    returned by MacroParser._spec: each key from _keys is counted as it 
+    is, followed by the n-grams and co-occurring pairs of any keys 
+    configured for them.
+    """
+    count_keys, ngrams, cooccurrence, pair_limit = spec
+    counted = [ (key, p.TokenDict[key]) for key in _keys(p, count_keys) ]
+    
+    for key in sorted(ngrams or { }):
+        if key in p.TokenDict:
+            tokens = list(p.TokenDict[key])
+            counted.extend(('%s.%dgram' % (key, n), _ngrams(tokens, n))
+                           for n in ngrams[key])
+    
+    for key in cooccurrence or [ ]:
+        if key in p.TokenDict:
+            counted.append(('%s.pairs' % key,
+                            _pairs(p.TokenDict[key], pair_limit)))
+    
+    return counted
+
+
+def _count_chunk(args):
+    """
+    Worker for parallel loading: parse a chunk of texts with parser_class
+    and return a list of (key, {token: count}) pairs, in the order the
+    keys were first counted. spec is as for _counted.
+    """
+    parser_class, texts, spec       = args
+    keys                            = [ ]
+    counts                          = { }
+    
+    for p in parser_class.parse_many(texts):
+        for key, tokens in _counted(p, spec):
+            if not key in counts:
+                keys.append(key)
+                counts[key] = Counter()
+            counts[key].update(tokens)
+    
+    return [ (key, counts[key]) for key in keys ]
 
 class MacroParser():
     """
@@ -25,7 +118,62 @@ class MacroParser():
     _init_hooks() function (by default an empty passing function) to 
     perform any custom setup.
     
-    There are four entry methods to add data to an instance:
+    The counts for each key are kept in an instance of DistributionClass 
+    (see distribution.py). The default, CounterDistribution, adds each 
+    parser's token lists in bulk; CompactDistribution trades some speed 
+    for a smaller memory footprint. NLTK is only imported when get_fd 
+    is called.
+    
+    By default every key in a parser's TokenDict is counted. Setting 
+    CountKeys to a list of keys restricts the distributions to those 
+    keys; combined with a lazy DefaultParserClass (see TokenParser), the 
+    other keys are never computed at all.
+    
+    N-grams and co-occurrences are counted in the same pass as the 
+    tokens, into distributions of their own:
+        NGrams                  -   maps a TokenDict key to a list of 
+                                    n-gram sizes, i.e. { 'clean': 
+                                    [ 2, 3 ] } counts the bigrams and 
+                                    trigrams of clean as 'clean.2gram' 
+                                    and 'clean.3gram'. An n-gram is 
+                                    stored as its tokens joined by 
+                                    spaces.
+        CoOccurrence            -   a list of TokenDict keys, i.e. 
+                                    [ 'special' ]. Each pair of distinct 
+                                    tokens in the same text (a URL and 
+                                    a ticker, say) is counted once per 
+                                    text as 'special.pairs', stored as 
+                                    the two tokens in sorted order 
+                                    joined by a space. Only the first 
+                                    PairLimit distinct tokens of a text 
+                                    are paired.
+    
+    The number of distinct n-grams and pairs grows with the corpus much 
+    faster than the vocabulary does (the pairs of a text grow with the 
+    square of its distinct tokens), so by default they are counted in a 
+    DerivedDistributionClass, a sketch.SketchDistribution: it counts in a 
+    fixed amount of memory, about 2MB per key, and keeps only the top 
+    1000 n-grams or pairs by name, with counts that may be too high (see 
+    sketch.py for its error bounds). Setting DerivedDistributionClass to 
+    None counts them exactly in DistributionClass instead, which keeps 
+    every distinct n-gram and pair in memory.
+    
+    DistributionClasses maps distribution keys to a backend to use 
+    instead of DistributionClass or DerivedDistributionClass. Other keys 
+    with an unbounded vocabulary, such as special on a long-running 
+    ingest, may also use a SketchDistribution, and a single n-gram key 
+    may be counted exactly:
+        macro.DistributionClasses = { 'special': SketchDistribution,
+                                      'clean.2gram': CounterDistribution }
+    get_top(key, n) lists the n most common tokens of any distribution, 
+    and get_fd on a sketch returns a FreqDist of its top tokens.
+    
+    merge(other) adds the distributions of another MacroParser, i.e. one 
+    built from another shard of the corpus, to this one. Sketches are 
+    merged as sketches, so a merged sketch has the same error bounds as 
+    one built over both shards.
+    
+    There are six entry methods to add data to an instance:
         import_parser(p)        -   import a TokenParser p
         import_raw(text)        -   import text. This is implemented such 
                                     that a new DefaultParserClass is 
@@ -34,30 +182,105 @@ class MacroParser():
                                     of Parsers.
         load_parsers(p_list)    -   load a list of parsers. calls 
                                     import_parser on each p.
-        load_raw(texts)         -   expects texts to be a list containing 
-                                    the inputs to len(texts) new 
-                                    DefaultParserClass objects.
+        load_raw(texts)         -   expects texts to be an iterable 
+                                    containing the inputs to new 
+                                    DefaultParserClass objects. The 
+                                    texts are parsed with 
+                                    DefaultParserClass.parse_many so the 
+                                    parser configuration is only set up 
+                                    once.
+        load_stream(lines)      -   stream texts from any iterable, such 
+                                    as a generator or an open file, one 
+                                    text per line. The distributions are 
+                                    updated as each text is parsed and 
+                                    no parsers are kept, so memory use 
+                                    does not grow with the length of the 
+                                    stream. Passing dedup = True skips 
+                                    texts that have already been seen.
+        load_file(path)         -   load_stream over the lines of a file.
+    
+    load_raw and load_stream can also parse in parallel: if Workers (or the 
+    workers argument) is greater than one, the texts are split into chunks of 
+    ChunkSize texts and parsed in a pool of worker processes. The workers 
+    send back token counts rather than parsers, so texts loaded this way 
+    are counted in the distributions but are not added to Parsers.
     
-    There are three data access functions:
+    Setting IndexKeys to a list of TokenDict keys, i.e. [ 'clean', 
+    'special' ], also indexes each imported parser under the tokens of 
+    those keys (see inverted_index.py), so that the parsers containing a 
+    set of tokens are found without scanning Parsers:
+        search(key, tokens)     -   returns the positions in Parsers of 
+                                    the parsers whose key contains all 
+                                    of tokens, or with match_all = 
+                                    False, any of them.
+        get_matches(key, tokens) -  as search, but returns the parsers.
+    Tokens are matched as they are stored, so words are looked up in 
+    clean lowercased. As with the distributions, only parsers added to 
+    Parsers are indexed. The indexes can be saved with 
+    save_postings(path) and read back with load_postings(path); document 
+    ids are positions in Parsers, which is not saved with them.
+    
+    There are five data access functions:
         get_keys()              -   returns a list of stored distributions
-        get_fd(key)             -   returns the FreqDist stored in key or 
-                                    None in the case of an invalid key.
+        get_fd(key, n)          -   returns a FreqDist of the counts stored 
+                                    in key or None in the case of an 
+                                    invalid key. If n is given, only the 
+                                    n most common tokens are included.
+        get_count(key, token)   -   returns the count of token in key.
+        get_top(key, n)         -   returns the n most common (token, 
+                                    count) pairs in key.
         get_parsers()           -   returns the list of parsers
+    
+    Setting the profile class attribute to a profiler.Profile records the
+    time and tokens counted per key by import_parser and load_stream, and
+    merged per key by parallel loads; see profiler.py.
+    
+    The distributions can be saved with save(path) and read back with 
+    load(path); see freq_index.py for the file format. By default load 
+    memory-maps the file and replaces the stored distributions with 
+    read-only views of it, which is enough for get_count, get_top and 
+    get_fd without reading the whole file. Counting anything more into a 
+    mapped distribution first copies it into a new one of the usual 
+    class. Passing mapped = False instead adds the saved counts to the 
+    current distributions. Shards saved by several MacroParsers can be 
+    combined with freq_index.merge_index.
     """
     
     Parsers                     = None
     Distributions               = None
     DistributionKeys            = None
+    Indexes                     = None
     
     DefaultParserClass          = None
+    DistributionClass           = None
+    
+    CountKeys                   = None      # TokenDict keys to count, or
+                                            # None for all of them
+    Workers                     = None      # processes used by load_raw
+    ChunkSize                   = 1000      # texts sent to a worker at once
+    DistributionClasses         = None      # per-key DistributionClass
+    DerivedDistributionClass    = SketchDistribution
+                                            # for n-gram and pair keys, or
+                                            # None for DistributionClass
+    NGrams                      = None      # { key: [ n, ... ] }
+    CoOccurrence                = None      # [ key, ... ]
+    PairLimit                   = 64        # distinct tokens paired per text
+    IndexKeys                   = None      # TokenDict keys to index for
+                                            # search, or None
+    profile                     = None      # a profiler.Profile, or None
     
     
     def __init__(self):
         self.Parsers            = [ ]
         self.DistributionKeys   = [ ]
         self.Distributions      = { }
+        self.Indexes            = { }       # key -> InvertedIndex
+        
+        self._parser_ids        = set( )    # ids of the parsers in Parsers
+        self._seen              = set( )    # digests of streamed texts
         
         self.DefaultParserClass = TokenParser
+        self.DistributionClass  = CounterDistribution
         
         self._init_hooks()
     
@@ -73,23 +296,90 @@ class MacroParser():
         dictionary.
         """
         
-        if p in self.Parsers:
+        if id(p) in self._parser_ids:
             return None
         
+        self._parser_ids.add(id(p))
+        self._index_parser(len(self.Parsers), p)
         self.Parsers.append(p)
+        self._count_parser(p)
+    
+    def _index_parser(self, doc, p):
+        """
+        Add parser p, which is Parsers[doc], to the indexes of IndexKeys.
+        """
+        for key in self.IndexKeys or [ ]:
+            if not key in self.Indexes:
+                self.Indexes[key] = InvertedIndex()
+            if key in p.TokenDict:
+                self.Indexes[key].add(doc, p.TokenDict[key])
+    
+    def _count_parser(self, p):
+        """
+        Add the tokens of parser p to the distributions.
+        """
+        if self.profile is not None:
+            self._profile_count(p)
+            return
         
-        keys    = p.TokenDict.keys()
+        for key, tokens in _counted(p, self._spec()):
+            self._distribution(key).update(tokens)
+    
+    def _spec(self):
+        """
+        Return what to count for each parser, as passed to _counted.
+        """
+        return (self.CountKeys, self.NGrams, self.CoOccurrence, 
+                self.PairLimit)
+    
+    def _profile_count(self, p):
+        """
+        _count_parser with each key timed separately. Computing a lazy 
+        parser's entry is left out of the time, as TokenParser records it.
+        """
+        profile = self.profile
+        prefix  = self.__class__.__name__ + '.import.'
         
-        for key in keys:
-            if not key in self.DistributionKeys:
-                loader                      = "p." + key + "()"
-                data                        = eval(loader)
-                self.Distributions[key]     = FreqDist(data)
-                self.DistributionKeys.append(key)
-            else:
-                for token in p.TokenDict[key]:
-                    self.Distributions[key].inc(token)
-                
+        for key, tokens in _counted(p, self._spec()):
+            start   = profile.timer()
+            self._distribution(key).update(tokens)
+            profile.record(prefix + key, 1, profile.timer() - start,
+                           len(tokens))
+    
+    def _distribution(self, key):
+        """
+        Return the distribution for key to count into, creating it if 
+        needed. A read-only distribution, as mapped by load(), is replaced 
+        by a copy that can be counted into.
+        """
+        dist    = self.Distributions.get(key)
+        if dist is not None and not dist.read_only:
+            return dist
+        
+        backend = self.DistributionClass
+        if self.DerivedDistributionClass and key in self._derived_keys():
+            backend = self.DerivedDistributionClass
+        
+        classes = self.DistributionClasses or { }
+        counts  = classes.get(key, backend)()
+        if dist is None:
+            self.DistributionKeys.append(key)
+        else:
+            counts.add_counts(dict(dist.items()))
+        self.Distributions[key] = counts
+        return counts
+    
+    def _derived_keys(self):
+        """
+        Return the set of n-gram and pair keys that NGrams and 
+        CoOccurrence count into.
+        """
+        keys = set( )
+        for key in self.NGrams or { }:
+            keys.update('%s.%dgram' % (key, n) for n in self.NGrams[key])
+        for key in self.CoOccurrence or [ ]:
+            keys.add('%s.pairs' % key)
+        return keys
     
     def import_raw(self, text):
         """
@@ -99,7 +389,7 @@ class MacroParser():
         self.import_parser(p)
     
 
-    def load_parsers(p_list):
+    def load_parsers(self, p_list):
         """
         Load a list of TokenParsers into the MacroParser.
         """
@@ -107,20 +397,191 @@ class MacroParser():
             self.import_parser(p)
     
     
-    def load_raw(self, texts):
+    def load_raw(self, texts, workers = None, chunksize = None):
+        """
+        Load an iterable of texts into the MacroParser. workers and 
+        chunksize override self.Workers and self.ChunkSize; with more than 
+        one worker the texts are parsed in parallel.
+        """
+        workers     = workers or self.Workers
+        chunksize   = chunksize or self.ChunkSize
+        
+        if workers and workers > 1:
+            self._load_parallel(texts, workers, chunksize)
+            return
+        
+        for p in self.DefaultParserClass.parse_many(texts):
+            self.import_parser(p)
+    
+    def load_stream(self, lines, dedup = False, workers = None, 
+                    chunksize = None):
+        """
+        Load texts from an iterable of lines without keeping the parsers. 
+        Trailing newlines are stripped. If dedup is True, any text that has 
+        been streamed into this MacroParser before is skipped; this keeps a 
+        digest of every distinct text. workers and chunksize are as for 
+        load_raw.
+        """
+        texts       = (line.rstrip('\r\n') for line in lines)
+        workers     = workers or self.Workers
+        chunksize   = chunksize or self.ChunkSize
+        
+        if dedup:
+            texts   = self._dedup(texts)
+        
+        if workers and workers > 1:
+            self._load_parallel(texts, workers, chunksize)
+            return
+        
+        for p in self.DefaultParserClass.parse_many(texts):
+            self._count_parser(p)
+    
+    def load_file(self, path, encoding = 'utf-8', **kwargs):
+        """
+        Stream the lines of the file at path into the MacroParser. Any 
+        keyword arguments are passed to load_stream.
+        """
+        with io.open(path, encoding = encoding) as lines:
+            self.load_stream(lines, **kwargs)
+    
+    def _dedup(self, texts):
         """
-        Load a list of texts into the MacroParser.
+        Filter texts, skipping any whose digest is already in self._seen.
         """
         for text in texts:
-            self.import_raw(text)
+            data = text
+            if not isinstance(data, bytes):
+                data = data.encode('utf-8')
+            
+            digest = hashlib.md5(data).digest()
+            if not digest in self._seen:
+                self._seen.add(digest)
+                yield text
+    
+    def _load_parallel(self, texts, workers, chunksize):
+        """
+        Parse texts in a pool of worker processes, chunksize texts at a 
+        time, and merge the counts they return into the distributions. 
+        Chunks are merged in order, so the result is the same as loading 
+        the texts serially. Up to two chunks per worker are kept in the 
+        pool, and a new chunk is submitted as each one is merged, so the 
+        other workers go on with the chunks after a slow one, and texts 
+        may be an unbounded stream.
+        """
+        texts   = iter(texts)
+        chunks  = iter(lambda: list(itertools.islice(texts, chunksize)), [ ])
+        pool    = multiprocessing.Pool(workers)
+        pending = deque()
+        
+        try:
+            for chunk in chunks:
+                job = (self.DefaultParserClass, chunk, self._spec())
+                pending.append(pool.apply_async(_count_chunk, (job, )))
+                if len(pending) >= workers * 2:
+                    self._merge_counts(pending.popleft().get())
+            while pending:
+                self._merge_counts(pending.popleft().get())
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        pool.join()
+    
+    def _merge_counts(self, counts):
+        """
+        Merge a list of (key, {token: count}) pairs into the distributions.
+        """
+        profile = self.profile
+        for key, fd in counts:
+            if profile is None:
+                self._distribution(key).add_counts(fd)
+                continue
+            
+            start = profile.timer()
+            self._distribution(key).add_counts(fd)
+            profile.record('%s.merge.%s' % (self.__class__.__name__, key), 1,
+                           profile.timer() - start, sum(fd.values()))
 
 
-    def get_fd(self, key):
+    def save(self, path):
+        """
+        Save all of the distributions to path.
+        """
+        save_index(path, [ (key, self.Distributions[key])
+                           for key in self.DistributionKeys ])
+    
+    def load(self, path, mapped = True):
+        """
+        Load distributions saved with save(). If mapped is True, the file 
+        is memory-mapped and its distributions replace any stored under 
+        the same keys; otherwise the saved counts are added to the 
+        current distributions.
+        """
+        for key, dist in load_index(path):
+            if not mapped:
+                self._distribution(key).add_counts(dict(dist.items()))
+                continue
+            
+            if not key in self.Distributions:
+                self.DistributionKeys.append(key)
+            self.Distributions[key] = dist
+    
+    def save_postings(self, path):
+        """
+        Save the indexes of IndexKeys to path.
+        """
+        save_postings(path, sorted(self.Indexes.items()))
+    
+    def load_postings(self, path):
+        """
+        Load indexes saved with save_postings(), replacing any stored 
+        under the same keys.
+        """
+        self.Indexes.update(load_postings(path))
+    
+    def merge(self, other):
+        """
+        Add the counts of each distribution in other, another MacroParser, 
+        to the distribution of the same key. Parsers and indexes are not 
+        copied.
+        """
+        for key in other.DistributionKeys:
+            self._distribution(key).merge(other.Distributions[key])
+    
+    def get_fd(self, key, n = None):
         if key in self.DistributionKeys:
-            return self.Distributions[key]
+            return self.Distributions[key].freqdist(n)
         else:
             return None
     
+    def get_count(self, key, token):
+        if key in self.DistributionKeys:
+            return self.Distributions[key].count(token)
+        else:
+            return 0
+    
+    def get_top(self, key, n = 10):
+        if key in self.DistributionKeys:
+            return self.Distributions[key].most_common(n)
+        else:
+            return None
+    
+    def search(self, key, tokens, match_all = True):
+        """
+        Return the positions in Parsers of the parsers whose key contains 
+        all of tokens, or any of them if match_all is False, in the order 
+        they were imported. key must be in IndexKeys.
+        """
+        if not key in self.Indexes:
+            return [ ]
+        if match_all:
+            return self.Indexes[key].intersect(tokens)
+        return self.Indexes[key].union(tokens)
+    
+    def get_matches(self, key, tokens, match_all = True):
+        return [ self.Parsers[doc] 
+                 for doc in self.search(key, tokens, match_all) ]
+    
     def get_keys(self):
         return self.DistributionKeys
     
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# file: profiler.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# opt-in instrumentation for the parse pipeline
+"""
+Collects call counts, wall time and token counts for the parsers and hooks
+run by TokenParser and the imports done by MacroParser. Profiling is off
+until a Profile is assigned to the profile class attribute:
+
+    profile = Profile()
+    TokenParser.profile = profile
+    MacroParser.profile = profile
+    ...
+    print(profile.report())
+    profile.reset()
+
+Setting it on TokenParser covers every derived class that does not set its
+own; entries are named after the class of the parser that recorded them,
+so a hook from a derived class shows up separately. Texts parsed in worker
+processes by a parallel load are not profiled.
+"""
+
+import time
+
+
+class Profile():
+    """
+    Aggregates measurements by name. Each entry counts:
+        calls       -   the number of times the function was called.
+        seconds     -   the cumulative wall time spent in it.
+        tokens      -   the number of tokens it was given.
+
+    TokenParser names its entries class.list.parser, where list is the
+    config list the parser came from, i.e. TokenParser.pre_tparsers._is_url
+    or UrlParser._pre_tparse._get_sites; the clean pass and _post_hooks
+    are recorded as class.clean and class._post_hooks. MacroParser records
+    class.import.key for each key counted by import_parser or load_stream,
+    and class.merge.key for counts merged from a parallel load.
+    """
+
+    # the clock used for all measurements
+    timer = staticmethod(getattr(time, 'perf_counter', time.time))
+
+    def __init__(self):
+        self._stats = { }
+
+    def record(self, name, calls, seconds, tokens):
+        """
+        Add a measurement to the entry for name.
+        """
+        entry = self._stats.get(name)
+        if entry is None:
+            entry = self._stats[name] = [ 0, 0.0, 0 ]
+        entry[0] += calls
+        entry[1] += seconds
+        entry[2] += tokens
+
+    def snapshot(self):
+        """
+        Return a copy of the entries as a dictionary of name to a
+        dictionary of calls, seconds and tokens.
+        """
+        return dict((name, { 'calls': calls, 'seconds': seconds,
+                             'tokens': tokens })
+                    for name, (calls, seconds, tokens)
+                    in self._stats.items())
+
+    def reset(self):
+        """
+        Discard every entry.
+        """
+        self._stats.clear()
+
+    def report(self):
+        """
+        Return the entries as a table, most time first.
+        """
+        lines = [ '%-48s %10s %10s %12s' % ('name', 'calls', 'seconds',
+                                            'tokens') ]
+        for name, (calls, seconds, tokens) in sorted(
+                self._stats.items(), key = lambda item: -item[1][1]):
+            lines.append('%-48s %10d %10.4f %12d' % (name, calls, seconds,
+                                                     tokens))
+        return '\n'.join(lines)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+# file: sketch.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# approximate, memory-bounded token counts
+"""
+Approximate counting for distributions too large to keep exactly, such as
+the n-gram counts of a large corpus or the URLs seen by a long-running
+ingest. A CountMinSketch estimates the count of any token from a fixed
+number of hashed counters, and a SpaceSaving summary keeps the most
+frequent tokens by name; SketchDistribution combines the two.
+
+All of them are mergeable: two sketches built from different parts of a
+corpus (in different workers, say, or different shards) can be merged
+into one with the same error bounds as a sketch of the whole corpus. The
+hashes are taken from the md5 digest of the utf-8 bytes of a token, so
+they are the same in every process and on every run, and sketches can be
+pickled to move them between processes.
+"""
+
+import hashlib
+import heapq
+import operator
+import struct
+from array import array
+
+from distribution import Distribution
+
+
+def _hashes(token):
+    """
+    Return two independent 32-bit hashes of token: the first two words of
+    its md5 digest. (crc32 and adler32 are not independent enough; for a
+    short token, adler32 is little more than the sum of its bytes.)
+    """
+    if not isinstance(token, bytes):
+        token = token.encode('utf-8')
+    return struct.unpack_from('<II', hashlib.md5(token).digest())
+
+
+class CountMinSketch():
+    """
+    depth rows of width counters. Adding a token adds to one counter per
+    row, chosen by hashing the token; the estimate of a token's count is
+    the smallest of its counters. Estimates are never too low, and are too
+    high by at most 2N/width with probability 1 - 1/2^depth, where N is
+    the total of all counts added.
+    """
+
+    width       = None
+    depth       = None
+    total       = 0
+
+    def __init__(self, width = 65536, depth = 4):
+        self.width  = width
+        self.depth  = depth
+        self.rows   = [ array('L', [ 0 ]) * width for i in range(depth) ]
+
+    def _cells(self, token):
+        """
+        Return the counter index of token in each row: row i uses
+        h1 + i * h2 for the two hashes of token.
+        """
+        h1, h2  = _hashes(token)
+        width   = self.width
+        step    = (h2 | 1) % width or 1
+        cell    = h1 % width
+        cells   = [ ]
+        for i in range(self.depth):
+            cells.append(cell)
+            cell = (cell + step) % width
+        return cells
+
+    def add(self, token, count = 1):
+        """
+        Add count to token and return its new estimate.
+        """
+        estimate = None
+        for row, cell in zip(self.rows, self._cells(token)):
+            value = row[cell] = row[cell] + count
+            if estimate is None or value < estimate:
+                estimate = value
+        self.total += count
+        return estimate
+
+    def estimate(self, token):
+        return min(row[cell] for row, cell
+                   in zip(self.rows, self._cells(token)))
+
+    def merge(self, other):
+        """
+        Add the counts of other, a sketch of the same width and depth.
+        """
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError('cannot merge sketches of different sizes')
+
+        self.rows   = [ array('L', map(operator.add, row, other_row))
+                        for row, other_row in zip(self.rows, other.rows) ]
+        self.total += other.total
+
+
+class SpaceSaving():
+    """
+    The Space-Saving summary of Metwally, Agrawal and El Abbadi: size
+    counters, each holding a token. A token that is not being counted
+    takes over the counter with the smallest count, and adds to it, so
+    every count is an overestimate of the token's true count by at most
+    the count it took over (recorded in errors). With N the total of all
+    counts added:
+        -   every token whose true count is more than N/size is counted.
+        -   no count is more than N/size too high.
+
+    merge() follows Agarwal et al., "Mergeable Summaries": a token missing
+    from one summary is given that summary's smallest count (if it is
+    full), and the size largest counts of the union are kept, which keeps
+    both bounds for the combined N.
+    """
+
+    size        = None
+    total       = 0
+
+    def __init__(self, size = 1000):
+        self.size       = size
+        self.counts     = { }               # token -> count
+        self.errors     = { }               # token -> most it is too high
+        self._heap      = [ ]               # (count, token), may be stale
+
+    def _least(self):
+        """
+        Return the token with the smallest count. Counts only grow, so a
+        heap entry whose count is out of date is pushed back with its
+        current one until the true minimum is on top.
+        """
+        heap, counts = self._heap, self.counts
+        while heap[0][0] != counts[heap[0][1]]:
+            least = heap[0][1]
+            heapq.heapreplace(heap, (counts[least], least))
+        return heap[0][1]
+
+    def add(self, token, count = 1):
+        """
+        Count token count more times and return its new count.
+        """
+        counts      = self.counts
+        self.total += count
+
+        if token in counts:
+            counts[token] += count
+            return counts[token]
+
+        error = 0
+        if len(counts) >= self.size:
+            least   = self._least()
+            error   = counts.pop(least)
+            del self.errors[least]
+            heapq.heappop(self._heap)
+
+        counts[token]       = error + count
+        self.errors[token]  = error
+        heapq.heappush(self._heap, (counts[token], token))
+        return counts[token]
+
+    def floor(self):
+        """
+        Return the most that a token not being counted can have occurred:
+        the smallest count once every counter is in use, and 0 before.
+        """
+        if len(self.counts) < self.size:
+            return 0
+        return self.counts[self._least()]
+
+    def merge(self, other):
+        """
+        Add the counts of other, a SpaceSaving summary of any size.
+        """
+        mine, theirs    = self.floor(), other.floor()
+        merged          = [ ]
+        for token in set(self.counts) | set(other.counts):
+            merged.append((self.counts.get(token, mine) +
+                           other.counts.get(token, theirs),
+                           self.errors.get(token, mine) +
+                           other.errors.get(token, theirs), token))
+
+        merged          = heapq.nlargest(self.size, merged)
+        self.counts     = dict((token, count)
+                               for count, error, token in merged)
+        self.errors     = dict((token, error)
+                               for count, error, token in merged)
+        self._heap      = [ (count, token) for count, error, token in merged ]
+        heapq.heapify(self._heap)
+        self.total     += other.total
+
+    def items(self):
+        return iter(self.counts.items())
+
+
+class SketchDistribution(Distribution):
+    """
+    A distribution that uses a fixed amount of memory however many
+    distinct tokens it sees: a CountMinSketch of width by depth counters
+    and a SpaceSaving summary of the top tokens. items(), most_common()
+    and freqdist() list only the tokens in the summary, which include
+    every token that makes up more than 1/top of the total. count() works
+    for any token.
+
+    Counts are never too low. The count of a token is the smaller of its
+    two estimates, so it is too high by no more than total()/top if the
+    token is in the summary, and otherwise by no more than
+    2 * total() / width with probability 1 - 1/2^depth.
+
+    Since the long tail is only kept in the sketch, __len__ is the number
+    of tokens in the summary, and saving the distribution (MacroParser.
+    save) keeps only those. To keep everything, pickle it instead.
+
+    To use other sizes than the defaults with MacroParser, give it a
+    function that makes the distribution, i.e.
+        functools.partial(SketchDistribution, width = 1 << 20, top = 5000)
+    """
+
+    def __init__(self, width = 65536, depth = 4, top = 1000):
+        self.sketch     = CountMinSketch(width, depth)
+        self.heavy      = SpaceSaving(top)
+
+    def update(self, tokens):
+        add     = self.sketch.add
+        heavy   = self.heavy
+        counts  = heavy.counts
+        for token in tokens:
+            add(token)
+            if token in counts:             # the common case, inlined
+                counts[token]  += 1
+                heavy.total    += 1
+            else:
+                heavy.add(token)
+
+    def add_counts(self, counts):
+        add     = self.sketch.add
+        heavy   = self.heavy
+        for token, count in counts.items():
+            add(token, count)
+            heavy.add(token, count)
+
+    def merge(self, other):
+        """
+        Add the counts of other. If other is another SketchDistribution,
+        it must have the same width and depth; its summary may be of any
+        size.
+        """
+        if not isinstance(other, SketchDistribution):
+            Distribution.merge(self, other)
+            return
+
+        self.sketch.merge(other.sketch)
+        self.heavy.merge(other.heavy)
+
+    def count(self, token):
+        estimate = self.sketch.estimate(token)
+        if token in self.heavy.counts:
+            return min(estimate, self.heavy.counts[token])
+        return estimate
+
+    def total(self):
+        return self.sketch.total
+
+    def items(self):
+        estimate = self.sketch.estimate
+        return ((token, min(count, estimate(token)))
+                for token, count in self.heavy.items())
+
+    def __len__(self):
+        return len(self.heavy.counts)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# file: token_cache.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# bounded least-recently-used cache for per-token results
+"""
+A size-bounded LRU mapping used by TokenParser to remember the tags and
+punctuation splits of tokens it has already seen.
+"""
+
+
+# indices into a cache entry
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+
+class TokenCache():
+    """
+    Maps keys to values, holding at most size entries. Looking a key up
+    with cache[key] raises KeyError on a miss, like a dict; storing a new
+    key in a full cache evicts the least recently used entry.
+
+    Entries are kept in a circular doubly linked list, most recently used
+    first, so lookups and evictions are constant time.
+
+    The counters hits, misses and evictions are available directly or as
+    a dictionary from stats().
+    """
+
+    size        = None
+    hits        = 0
+    misses      = 0
+    evictions   = 0
+
+    def __init__(self, size):
+        self.size       = size
+        self._entries   = { }
+        self._root      = [ ]           # sentinel for the linked list
+        self._root[:]   = [ self._root, self._root, None, None ]
+
+    def __getitem__(self, key):
+        try:
+            entry = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self.hits += 1
+        root = self._root
+        if entry[PREV] is not root:     # move to the front of the list
+            entry[PREV][NEXT]   = entry[NEXT]
+            entry[NEXT][PREV]   = entry[PREV]
+            entry[PREV]         = root
+            entry[NEXT]         = root[NEXT]
+            root[NEXT][PREV]    = entry
+            root[NEXT]          = entry
+        return entry[VALUE]
+
+    def __setitem__(self, key, value):
+        root = self._root
+        if key in self._entries:
+            self._entries[key][VALUE] = value
+            return
+
+        if len(self._entries) >= self.size:
+            oldest              = root[PREV]
+            oldest[PREV][NEXT]  = root
+            root[PREV]          = oldest[PREV]
+            del self._entries[oldest[KEY]]
+            self.evictions += 1
+
+        entry               = [ root, root[NEXT], key, value ]
+        root[NEXT][PREV]    = entry
+        root[NEXT]          = entry
+        self._entries[key]  = entry
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._entries.clear()
+        self._root[:] = [ self._root, self._root, None, None ]
+
+    def stats(self):
+        return { 'size': self.size, 'entries': len(self._entries),
+                 'hits': self.hits, 'misses': self.misses,
+                 'evictions': self.evictions }
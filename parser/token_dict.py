@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+# file: token_dict.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# lazily computed TokenDict
+"""
+A dictionary whose entries can be deferred: a deferred entry is computed
+the first time it is looked up, and stored like any other value from then
+on. TokenParser uses it for its TokenDict in lazy mode.
+"""
+
+
+class LazyTokenDict(dict):
+    """
+    defer(keys, builder) marks keys as pending. Looking up any of them
+    calls builder() once, with all of its keys already removed from the
+    pending set, so the builder may read and assign them (and any other
+    entries) through the dictionary normally. The builder must store the
+    values of its keys.
+
+    Pending keys are present in the dictionary (with whatever value they
+    had before), so keys(), len() and membership tests never compute
+    anything. Methods that return values in bulk, such as items(),
+    values(), copy() and comparisons, compute every pending entry first,
+    as does dict(d) under python 3.
+    """
+
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._pending = { }
+
+    def defer(self, keys, builder):
+        for key in keys:
+            self._pending[key] = builder
+
+    def pending(self):
+        """
+        Return a list of the keys that have not been computed.
+        """
+        return list(self._pending)
+
+    def _build(self, key):
+        builder = self._pending[key]
+        for k in [ k for k, b in self._pending.items() if b is builder ]:
+            del self._pending[k]
+        builder()
+
+    def materialize(self):
+        """
+        Compute every pending entry.
+        """
+        while self._pending:
+            self._build(next(iter(self._pending)))
+
+    def __getitem__(self, key):
+        if key in self._pending:
+            self._build(key)
+        return dict.__getitem__(self, key)
+
+    def __setitem__(self, key, value):
+        self._pending.pop(key, None)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        self._pending.pop(key, None)
+        dict.__delitem__(self, key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def get(self, key, default = None):
+        if key in self:
+            return self[key]
+        return default
+
+    def pop(self, key, *default):
+        if key in self._pending:
+            self._build(key)
+        return dict.pop(self, key, *default)
+
+    def setdefault(self, key, default = None):
+        if key in self:
+            return self[key]
+        return dict.setdefault(self, key, default)
+
+    def __iter__(self):
+        # overriding __iter__ stops python 3 from copying the dictionary
+        # directly in dict(d) and {**d}; it uses keys() and __getitem__
+        # instead, which computes any pending entries. python 2 always
+        # copies subclasses of dict directly, so there dict(d.copy()) or
+        # d.materialize() first is needed.
+        return dict.__iter__(self)
+    
+    def items(self):
+        self.materialize()
+        return dict.items(self)
+
+    def values(self):
+        self.materialize()
+        return dict.values(self)
+
+    def iteritems(self):
+        self.materialize()
+        return iter(dict.items(self))
+
+    def itervalues(self):
+        self.materialize()
+        return iter(dict.values(self))
+
+    def copy(self):
+        self.materialize()
+        return dict(self)
+
+    def __eq__(self, other):
+        self.materialize()
+        if isinstance(other, LazyTokenDict):
+            other.materialize()
+        return dict.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        self.materialize()
+        return dict.__repr__(self)
+
+    __hash__ = None
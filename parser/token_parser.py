@@ -12,10 +12,18 @@ natural language processing. This class is inheritable and provides hooks
 for subsystem-specific parsing.
 """
 
+import copy
+import itertools
 import re
+import unicodedata
+from classifier import Classifier
 from config import internal_config
+from token_cache import TokenCache
+from token_dict import LazyTokenDict
+from token_spans import TokenSpans
+from tokenizer import Tokenizer
 
-class TokenParser():
+class TokenParser(object):
     """
     This class takes a list of tokens, processes them, and provides a list 
     of 'clean' tokens, separating out special tokens. There are several 
@@ -68,6 +76,39 @@ class TokenParser():
     Also by default, the __str__ method will return the sentence list, 
     i.e. a list of tokens with punctuation.
     
+    To parse a large number of texts with the same configuration, use the
+    class method parse_many(texts); it sets up the configuration once and
+    yields a parser for each text.
+    
+    Passing lazy = True to the instantiator (or setting the lazy class
+    attribute) defers each pass until its TokenDict entry is first used, so
+    a caller that only needs special() never runs the sentence passes.
+    
+    A string passed to the instantiator is split on single spaces, as
+    str.split(" ") does. Setting the tokenizer class attribute to a
+    tokenizer.Tokenizer splits it on any run of whitespace instead, and
+    also takes any other buffer the tokenizer can scan, such as an mmap'd
+    file (give the tokenizer an encoding to decode it). The tokenizer tags
+    each token with the parser's regexes as it scans it, so the passes
+    never classify a token again.
+    
+    In span mode (the span_mode class attribute), string input is always
+    tokenized with offsets, and the TokenDict lists are TokenSpans holding
+    the (start, end) offsets of each token in the input rather than the
+    tokens themselves; spans(key) returns the offsets. Tokens are sliced
+    out of the input as they are looked up, and the accessors still return
+    lists of strings. Under python 3, byte input (bytes or an mmap) is
+    decoded with the tokenizer's encoding, or as utf-8 if no tokenizer is
+    set; a tokenizer without an encoding raises TypeError for it.
+    Sentence hooks, do_sparsers other than _replace_punctuation and
+    clean_normalize may all produce tokens that are not in the input, so
+    with any of those sent and clean are stored as lists as usual.
+    Span mode does all of the passes up front, even if lazy is set.
+    
+    Setting the profile class attribute to a profiler.Profile records the
+    calls, time and tokens of every parser and hook, the clean pass and
+    _post_hooks across all instances; see profiler.py.
+    
     Hooks:
         There are six hooks: a tparse and sparse version of the pre, do, 
         and post-parsing. Ex, _pre_tparse, _do_sparse.
@@ -107,39 +148,314 @@ class TokenParser():
         'ticker':'^(\()?\$([A-Z]{1,5})(\))?$',
         'punc':'([\\s\\w]*)([^\\w\\s])([\\s\\w]*)',
         'emoticon':'(:-?[()OD/])',
-        'strip':'[@#$%^&*]'
+        'strip':'[@#$%^&*]',
+        'word':r'^\w*$'
         }
 
+    # extra re flags for individual regexes (re.U is always used)
+    regex_flags     = { 'email': re.I }
+
+    # regexes used to rewrite tokens rather than classify them. these are
+    # compiled but left out of the combined token classifier.
+    regex_rewrite   = [ 'punc', 'strip' ]
+
     # internal TokenParser structure
     TokenDict   = None
     config      = None
 
+    # parser strings from the config lists resolved to attribute names, keyed
+    # on (class, name). shared across instances so each name is looked up
+    # once per class instead of being eval()'d for every token.
+    _resolved   = { }
+
+    # compiled Classifiers, keyed on the regexes they were built from so a
+    # derived class changing self.regex gets a fresh one.
+    _classifiers    = { }
+    _classifier     = None
+    _tags           = None
+    _tag_cache      = None
+    _splits         = None
+
+    # in lazy mode the TokenDict is a LazyTokenDict and each entry is only
+    # computed when it is first looked up. may be set per class or passed
+    # to the instantiator.
+    lazy            = False
+
+    # maximum number of cached token tags shared by a parse_many batch
+    batch_tag_limit = 65536
+
+    # size of the LRU caches of token tags and punctuation splits shared by
+    # all instances of a class; 0 disables them. the caches are keyed on
+    # the regexes and preserve_token list, so changing either starts a new
+    # cache for the class.
+    token_cache_size    = 0
+    _token_caches       = { }
+
+    # a profiler.Profile to record the parsers and hooks in, or None
+    profile             = None
+
+    # a tokenizer.Tokenizer to split string input with, or None to split
+    # on single spaces
+    tokenizer           = None
+    _default_tokenizer  = Tokenizer()
+    _utf8_tokenizer     = Tokenizer(encoding = 'utf-8')
+    _nonspace           = re.compile(r'\S+', re.U)
+
+    # in span mode the TokenDict lists hold offsets into string input
+    span_mode           = False
+
     
     ##########################
     # initialization methods #
     ##########################
     
-    def __init__(self, tokens):
-        if hasattr(tokens, 'split'):        # if tokens is passed in as str,
-            tokens = tokens.split(" ")      # convert to a list
+    def __init__(self, tokens, lazy = None):
+        if lazy is not None:
+            self.lazy = lazy
+        
+        self._init_parser()
+        self._parse(tokens)
+    
+    @classmethod
+    def parse_many(cls, texts):
+        """
+        Parse an iterable of texts (strings or token lists), yielding one
+        parser per text. The configuration, hooks and compiled regexes are
+        set up once and shared by every parser yielded, so only the
+        TokenDict is allocated per text. The parsers also share one cache
+        of token tags, which is emptied whenever it grows past
+        batch_tag_limit entries. Derived classes should do all of their set
+        up in _init_hooks, as their __init__ is not called.
+        """
+        template    = cls.__new__(cls)
+        template._init_parser()
+        tags        = template._tags        # shared by the whole batch
+        
+        for text in texts:
+            if len(tags) > cls.batch_tag_limit:
+                tags.clear()
             
+            p               = cls.__new__(cls)
+            p.__dict__.update(template.__dict__)
+            p.TokenDict     = dict((key, value[:] if type(value) is list
+                                         else copy.copy(value))
+                                   for key, value in template.TokenDict.items())
+            p._parse(text)
+            yield p
+    
+    def _init_parser(self):
+        """
+        Set up everything that does not depend on the tokens being parsed.
+        """
         self._init_config()
         self._init_token_dict()
         self._init_hooks() 
+        self._init_classifier()
+    
+    def _parse(self, tokens):
+        """
+        Run the parsing passes over tokens and fill in the TokenDict, or in
+        lazy mode, set up the TokenDict to run each pass on demand.
+        """
+        if self.span_mode and not isinstance(tokens, (list, tuple)):
+            self._parse_spans(tokens)
+            self._tags = None
+            return
+        
+        # a string is split into a list of tokens; with a tokenizer, so is
+        # any other buffer, such as an mmap'd file
+        if hasattr(tokens, 'split') or (self.tokenizer is not None and
+                                        not isinstance(tokens, (list, tuple))):
+            tokens = self._tokenize(tokens)
+        
+        if self.lazy:
+            self._parse_lazy(tokens)
+            return
 
         self.TokenDict['tokens'] = tokens[:]
+        self._build_special(tokens[:])
+        self._build_sent(tokens[:])
+        self._build_clean()
+        self._run_post_hooks()              # set up any post processing
+        
+        # the tags are only needed while parsing; a parser kept by a
+        # MacroParser should not hold on to one for every distinct token.
+        # a parse_many batch keeps its shared tags in the template.
+        self._tags = None
+    
+    def _tokenize(self, text):
+        """
+        Split a string, or with a tokenizer any buffer, into a list of
+        tokens. The tokenizer tags each token through _tag as it is
+        scanned, so the passes find the tags in the parser's tag cache.
+        """
+        if self.tokenizer is None:
+            return text.split(" ")
+        return [ token for token, start, end, tags
+                 in self._scanner(text).tag(text, classify = self._tag) ]
+    
+    def _scanner(self, text):
+        """
+        Return the tokenizer to scan text with. Under python 3 a byte
+        buffer, such as bytes or an mmap, has to be decoded: the default
+        tokenizer decodes it as utf-8, and a tokenizer that has been set
+        must have an encoding.
+        """
+        tokenizer = self.tokenizer
+        if bytes is str or isinstance(text, str):   # python 2, or text
+            return tokenizer or self._default_tokenizer
+        
+        if tokenizer is None:
+            return self._utf8_tokenizer
+        if tokenizer.encoding is None:
+            raise TypeError('byte input needs a tokenizer with an encoding, '
+                            'i.e. Tokenizer(encoding = "utf-8")')
+        return tokenizer
+    
+    def _parse_spans(self, text):
+        """
+        Span mode: tokenize text with offsets and fill the TokenDict with
+        TokenSpans into it. The passes are the same as in _parse, but work
+        on token indices and offsets so that each result can be stored as
+        offsets.
+        """
+        tokenizer   = self._scanner(text)
+        encoding    = tokenizer.encoding
+        if isinstance(text, type(u'')):
+            encoding = None
+        
+        scanned     = [ (token, start, end) for token, start, end, tags
+                        in tokenizer.tag(text, classify = self._tag) ]
+        tokens      = [ token for token, start, end in scanned ]
+        TokenDict   = self.TokenDict
+        
+        TokenDict['tokens']     = spans = TokenSpans(text, encoding)
+        for token, start, end in scanned:
+            spans.add(start, end)
+        
+        TokenDict['special']    = spans = TokenSpans(text, encoding)
+        for i in self._select_tokens(self.config._pre_tparse,
+                                     self.config.pre_tparsers, tokens,
+                                     'pre_tparse'):
+            spans.add(scanned[i][1], scanned[i][2])
         
+        if (self.config._do_sparse or self.config.clean_normalize or
+            not self._splits_in_place()):
+            self._build_sent(tokens)
+            self._build_clean()
+            self._run_post_hooks()
+            return
+        
+        profile     = self.profile
+        if profile is not None:
+            began   = profile.timer()
+        sent        = self._replace_punctuation_spans(scanned, encoding)
+        if profile is not None:
+            profile.record(self._profile_name('do_sparsers',
+                                              '_replace_punctuation'),
+                           1, profile.timer() - began, len(tokens))
+            began   = profile.timer()
+        
+        form        = self._clean_form()
+        special     = set(TokenDict['special'])
+        stopwords   = self._stopwords()
+        is_word     = self._is_word
+        
+        TokenDict['sent']       = spans = TokenSpans(text, encoding)
+        TokenDict['clean']      = clean = TokenSpans(text, encoding, form)
+        for token, start, end in sent:
+            spans.add(start, end)
+            if token in special or not is_word(token):
+                continue
+            if stopwords and form(token) in stopwords:
+                continue
+            clean.add(start, end)
+        
+        if profile is not None:
+            profile.record(self._profile_name('clean'), 1,
+                           profile.timer() - began, len(sent))
+        self._run_post_hooks()
+    
+    def _splits_in_place(self):
+        """
+        Return True if the sentence pass is just the built-in
+        _replace_punctuation, whose output span mode can track.
+        """
+        parsers = [ self._resolve_parser(f)
+                    for f in self.config.do_sparsers or [ ] ]
+        return (len(parsers) == 1 and
+                getattr(parsers[0], '__func__', None) is
+                TokenParser.__dict__['_replace_punctuation'])
+    
+    def _parse_lazy(self, tokens):
+        """
+        Replace the TokenDict with a LazyTokenDict whose entries are built
+        on first access. The passes share tokens rather than copies of it,
+        so hooks must not modify the list they are given. Any keys added
+        by a derived class are filled by _post_hooks, which runs once all
+        of the built-in entries have been computed. The tags are released
+        once the last pending entry has been computed, as after an eager
+        parse.
+        """
+        self.TokenDict  = TokenDict = LazyTokenDict(self.TokenDict)
+        builtin         = [ 'tokens', 'special', 'sent', 'clean' ]
+        
+        def build_tokens():
+            TokenDict['tokens'] = tokens
+        
+        def build_post():
+            for key in builtin:
+                TokenDict[key]
+            self._run_post_hooks()
+        
+        def defer(keys, builder):
+            def build():
+                builder()
+                if not TokenDict.pending():
+                    self._tags = None
+            TokenDict.defer(keys, build)
+        
+        defer([ 'tokens' ], build_tokens)
+        defer([ 'special' ], lambda: self._build_special(tokens))
+        defer([ 'sent' ], lambda: self._build_sent(tokens))
+        defer([ 'clean' ], self._build_clean)
+        defer([ key for key in TokenDict if not key in builtin ], build_post)
+    
+    def _build_special(self, tokens):
         self.TokenDict['special'].extend(self._parse_tokens(
                                                 self.config._pre_tparse,
                                                 self.config.pre_tparsers,
-                                                tokens[:]))
+                                                tokens, 'pre_tparse'))
+    
+    def _build_sent(self, tokens):
         self.TokenDict['sent']   = self._parse_sent(
                                                 self.config._do_sparse,
                                                 self.config.do_sparsers,
-                                                tokens[:])
-        self.TokenDict['clean']  = self._clean_tokens(
-                                                self.TokenDict['sent'])
-        self._post_hooks()                  # set up any post processing
+                                                self._normalize(tokens),
+                                                'do_sparse')
+    
+    def _build_clean(self):
+        sent    = self.TokenDict['sent']
+        profile = self.profile
+        if profile is None:
+            self.TokenDict['clean'] = self._clean_tokens(sent)
+            return
+        
+        start   = profile.timer()
+        self.TokenDict['clean'] = self._clean_tokens(sent)
+        profile.record(self._profile_name('clean'), 1,
+                       profile.timer() - start, len(sent))
+    
+    def _run_post_hooks(self):
+        profile = self.profile
+        if profile is None:
+            self._post_hooks()
+            return
+        
+        start   = profile.timer()
+        self._post_hooks()
+        profile.record(self._profile_name('_post_hooks'), 1,
+                       profile.timer() - start, 0)
         
     def _init_config(self):
         self.config = internal_config( )    
@@ -165,6 +481,11 @@ class TokenParser():
         # the rest of the sentence. For example, a URL should be preserved.
         self.config.preserve_token  = [ 'self._is_url', 'self._is_emoticon',
                                         'self._is_stock' ]
+        
+        # the clean pass lowercases tokens by default; see config.py
+        self.config.clean_casefold  = False
+        self.config.clean_normalize = None
+        self.config.clean_stopwords = None
     
     def _init_token_dict(self):
         self.TokenDict   = { }
@@ -176,6 +497,46 @@ class TokenParser():
         self.TokenDict['tokens']    = [ ]   # the original list of tokens 
                                             # instance was instantiated with
     
+    def _init_classifier(self):
+        """
+        Look up (or compile) the Classifier for the current regexes and set
+        up the per-instance cache of token tags. If token_cache_size is
+        set, the class's shared LRU caches of tags and splits sit behind
+        it.
+        """
+        key = (tuple(sorted(self.regex.items())),
+               tuple(sorted(self.regex_flags.items())),
+               tuple(self.regex_rewrite))
+        
+        if not key in TokenParser._classifiers:
+            TokenParser._classifiers[key] = Classifier(self.regex,
+                                                       self.regex_flags,
+                                                       self.regex_rewrite)
+        self._classifier    = TokenParser._classifiers[key]
+        self._tags          = { }
+        
+        if not self.token_cache_size:
+            return
+        
+        key     = (key, tuple(self.config.preserve_token))
+        caches  = TokenParser._token_caches.setdefault(self.__class__, { })
+        if not key in caches:
+            caches.clear()              # the regexes changed; start over
+            caches[key] = (TokenCache(self.token_cache_size),
+                           TokenCache(self.token_cache_size))
+        self._tag_cache, self._splits = caches[key]
+    
+    @classmethod
+    def token_cache_stats(cls):
+        """
+        Return the statistics of the class's shared token caches as a
+        dictionary with 'tags' and 'splits' entries, or None if the caches
+        have not been set up.
+        """
+        for tags, splits in TokenParser._token_caches.get(cls, { }).values():
+            return { 'tags': tags.stats(), 'splits': splits.stats() }
+        return None
+    
     def _init_hooks(self):
         pass
 
@@ -191,35 +552,54 @@ class TokenParser():
     ###################################
     
     def sent(self):
-        return self.TokenDict['sent']
+        return self._strings('sent')
     
     def sent_str(self):
         return ' '.join(self.TokenDict['sent'])
         
     def special(self):
-        return self.TokenDict['special']
+        return self._strings('special')
     
     def special_str(self):
         return  ' '.join(self.TokenDict['special'])
     
     def clean(self):
-        return self.TokenDict['clean']
+        return self._strings('clean')
     
     def clean_str(self):
         return ' '.join(self.TokenDict['clean'])
         
     def tokens(self):
-        return self.TokenDict['tokens']
+        return self._strings('tokens')
     
     def tokens_str(self):
         return ' '.join(self.TokenDict['tokens'])
+    
+    def spans(self, key):
+        """
+        Return a list of the (start, end) offsets of the tokens in key, or
+        None if key is not stored as spans.
+        """
+        tokens = self.TokenDict[key]
+        if isinstance(tokens, TokenSpans):
+            return tokens.spans()
+        return None
+    
+    def _strings(self, key):
+        """
+        Return the TokenDict entry for key as a list of strings.
+        """
+        tokens = self.TokenDict[key]
+        if isinstance(tokens, TokenSpans):
+            return list(tokens)
+        return tokens
             
 
     #########################
     # parser methods follow #
     #########################
     
-    def _parse_tokens(self, hook, parsers, tokens):
+    def _parse_tokens(self, hook, parsers, tokens, stage = None):
         """
         Generic parsing pass method.
             hook should be the hook that derived classes can use to provide
@@ -233,34 +613,91 @@ class TokenParser():
             tokens is the list of tokens to be acted on, i.e. 
             TokenDict['sent'].
             
+            stage names the pass for profiling, i.e. 'pre_tparse'.
+            
             Returns the parsebed list of tokens.
         """
         _tokens = [ ]                       # internal token list
-        special = None
+        passes  = self._passes(hook, parsers, stage)
+        
+        if self.profile is not None:
+            return self._profile_tokens(passes, tokens)
+        
+        # a single scan over the tokens; each parser collects its matches
+        # in its own list so the output is still grouped by parser.
+        passes  = [ (self._resolve_parser(f), [ ]) for source, f in passes ]
+        for token in tokens:
+            for f, special in passes:
+                if f(token): special.append(token)
+        
+        for f, special in passes:
+            _tokens.extend(special)
+        
+        return _tokens
+    
+    def _passes(self, hook, parsers, stage):
+        """
+        Return the parsers of a token parsing pass in the order they run,
+        as (name of the config list, parser) pairs.
+        """
+        passes  = [ ]
         
         if hook and self.config.hook_priority:
-            
-            for f in hook:
-                if not f: continue
-                special = [ token for token in tokens if eval(f)(token)]
-                _tokens.extend(special)
+            passes.extend(('_%s' % stage, f) for f in hook if f)
             
         if parsers:
             for f in parsers:
                 if not f: break
-                special = [ token for token in tokens if eval(f)(token)]
-                _tokens.extend(special)
+                passes.append(('%srs' % stage, f))
             
         if hook and not self.config.hook_priority:
-            for f in hook:
-                if not f: continue
-                special = [ token for token in tokens if eval(f)(token)]
-                if special: _tokens.extend(special)
-
+            passes.extend(('_%s' % stage, f) for f in hook if f)
+        
+        return passes
+    
+    def _select_tokens(self, hook, parsers, tokens, stage):
+        """
+        Like _parse_tokens, but return the indices of the matching tokens
+        rather than the tokens.
+        """
+        profile = self.profile
+        indices = [ ]
+        
+        for source, f in self._passes(hook, parsers, stage):
+            if profile is not None:
+                name    = self._profile_name(source, f)
+                start   = profile.timer()
+            
+            f = self._resolve_parser(f)
+            indices.extend(i for i, token in enumerate(tokens) if f(token))
+            
+            if profile is not None:
+                profile.record(name, len(tokens), profile.timer() - start,
+                               len(tokens))
+        
+        return indices
+    
+    def _profile_tokens(self, passes, tokens):
+        """
+        _parse_tokens with profiling: each parser is run over all of the
+        tokens in turn and timed as a whole, which gives the same result
+        as the interleaved scan.
+        """
+        profile = self.profile
+        _tokens = [ ]
+        
+        for source, f in passes:
+            name    = self._profile_name(source, f)
+            f       = self._resolve_parser(f)
+            start   = profile.timer()
+            for token in tokens:
+                if f(token): _tokens.append(token)
+            profile.record(name, len(tokens), profile.timer() - start,
+                           len(tokens))
         
         return _tokens
 
-    def _parse_sent(self, hook, parsers, tokens):
+    def _parse_sent(self, hook, parsers, tokens, stage = None):
         """
         Generic sentence parsing pass method.
             hook should be the hook that derived classes can use to provide
@@ -274,31 +711,177 @@ class TokenParser():
             tokens is the list of tokens to be acted on, i.e. 
             TokenDict['sent'].
             
+            stage names the pass for profiling, i.e. 'do_sparse'.
+            
             Returns the parsed list of tokens.        
         """
         
         _tokens = tokens
         
+        if self.profile is None:
+            run = lambda f, source: self._resolve_parser(f)
+        else:
+            run = self._profile_sent
+        
         if hook and self.config.hook_priority:
             for f in hook:
-                _tokens = eval(f)(_tokens)
+                _tokens = run(f, '_%s' % stage)(_tokens)
         
         if parsers:
             for f in parsers:
-                _tokens = eval(f)(_tokens)
+                _tokens = run(f, '%srs' % stage)(_tokens)
         
         if hook and not self.config.hook_priority:
             for f in hook:
-                _tokens = eval(f)(_tokens)
+                _tokens = run(f, '_%s' % stage)(_tokens)
                 
         return _tokens
+    
+    def _profile_sent(self, f, source):
+        """
+        Resolve f as _resolve_parser does, wrapped so that each call is
+        recorded in the profile.
+        """
+        profile = self.profile
+        name    = self._profile_name(source, f)
+        f       = self._resolve_parser(f)
+        
+        def timed(tokens):
+            start   = profile.timer()
+            result  = f(tokens)
+            profile.record(name, 1, profile.timer() - start, len(tokens))
+            return result
+        
+        return timed
+    
+    def _profile_name(self, source, f = None):
+        """
+        Return the profile entry name for parser f from the config list
+        source, or for source alone if f is None.
+        """
+        name = '%s.%s' % (self.__class__.__name__, source)
+        if f is None:
+            return name
+        
+        if callable(f):
+            f = getattr(f, '__name__', repr(f))
+        elif f.strip().startswith('self.'):
+            f = f.strip()[len('self.'):]
+        return '%s.%s' % (name, f)
 
     def _clean_tokens(self, tokens):
-        _tokens =   [ token.lower() for token in tokens
-                      if not token in self.TokenDict['special'] and
-                         self._is_word(token)
-                    ]
+        """
+        Return the tokens that are words and not special tokens, lowercased.
+        If set in the config, clean_casefold is applied to each token and
+        clean_stopwords are then dropped, all in the same pass; stopwords
+        should therefore be given in their cleaned form. The tokens have
+        already been normalized to clean_normalize by the sentence pass,
+        so the special tokens are normalized to match.
+        """
+        special     = set(self._normalize(self.TokenDict['special']))
+        stopwords   = self._stopwords()
+        form        = self._clean_form()
+        is_word     = self._is_word
+        _tokens     = [ ]
+        
+        for token in tokens:
+            if token in special or not is_word(token):
+                continue
+            
+            token = form(token)
+            if stopwords and token in stopwords:
+                continue
+            _tokens.append(token)
+        
         return _tokens
+    
+    def _stopwords(self):
+        """
+        Return clean_stopwords as a set. A list or other iterable is
+        converted to a frozenset in the config the first time, so each
+        lookup in the clean pass takes constant time.
+        """
+        stopwords = self.config.clean_stopwords
+        if stopwords and not isinstance(stopwords, (set, frozenset)):
+            stopwords = self.config.clean_stopwords = frozenset(stopwords)
+        return stopwords
+    
+    def _clean_form(self):
+        """
+        Return the function the clean pass applies to each token: it
+        lowercases (or with clean_casefold, casefolds) the token.
+        """
+        casefold    = self.config.clean_casefold
+        
+        def form(token):
+            if casefold and hasattr(token, 'casefold'):
+                return token.casefold()
+            return token.lower()
+        
+        return form
+    
+    def _normalize(self, tokens):
+        """
+        Return tokens converted to the unicode normal form clean_normalize,
+        or tokens itself if that is not set. This is done before the
+        sentence pass, so that punctuation splitting and the word test see
+        the normalized tokens: a word written with combining accents is
+        only one word once composed. Byte strings are left as they are.
+        """
+        normalize   = self.config.clean_normalize
+        if not normalize:
+            return tokens
+        return [ token if isinstance(token, bytes)
+                 else unicodedata.normalize(normalize, token)
+                 for token in tokens ]
+
+    def _resolve_parser(self, f):
+        """
+        Resolve an entry from one of the parser lists to a callable bound
+        to this instance. Entries may be callables or strings of the form
+        'self._is_url'; the latter are parsed once per class and cached in
+        TokenParser._resolved. Any other string is eval()'d as before.
+        """
+        if callable(f):
+            return f
+        
+        key = (self.__class__, f)
+        if not key in TokenParser._resolved:
+            match = re.match(r'^\s*self\.([A-Za-z_]\w*)\s*$', f)
+            TokenParser._resolved[key] = match and match.group(1)
+        
+        name = TokenParser._resolved[key]
+        if name:
+            return getattr(self, name)
+        return eval(f)
+    
+    def _tag(self, token):
+        """
+        Return the set of regex classes token belongs to. Tags are cached
+        per instance while parsing so the special, preserve and clean
+        passes classify each distinct token only once, and in the class's
+        shared LRU cache if there is one.
+        """
+        seen = self._tags
+        if seen is None:                    # released after parsing
+            seen = self._tags = { }
+        
+        try:
+            return seen[token]
+        except KeyError:
+            pass
+        
+        cache = self._tag_cache
+        if cache is None:
+            tags = self._classifier.classify(token)
+        else:
+            try:
+                tags = cache[token]
+            except KeyError:
+                tags = cache[token] = self._classifier.classify(token)
+        
+        seen[token] = tags
+        return tags
 
     ##############################
     # internal parsing functions #
@@ -308,57 +891,176 @@ class TokenParser():
         """
         private function to determine if a token is a url.
         """
-        return re.match(self.regex['url'], token, re.U)
+        return 'url' in self._tag(token)
     
     def _is_stock(self, token):
         """
         private function to determine if a token is a stock symbol
         """
-        return re.match(self.regex['ticker'] , token, re.U)
+        return 'ticker' in self._tag(token)
     
     def _replace_punctuation(self, tokens):
+        """
+        Split punctuation out of tokens into separate elements. tokens may
+        be any iterable; the sentence is built in a single pass by appending
+        to the output, so the running time is linear in the input.
         
-        _tokens = tokens
+        The first punctuation character found in a token is inserted after
+        the first piece of the token; any later punctuation in the same
+        token is dropped. Characters matching the 'strip' regex are never
+        inserted. Tokens that satisfy one of the preserve_token parsers are
+        passed through untouched.
+        """
+        sent     = [ ]
+        pending  = [ ]                  # split pieces still to be visited,
+                                        # in reverse order
+        skip     = 0                    # tokens to pass through unexamined
+        tokens   = iter(tokens)
+        splits   = self._splits
         
-        # strip characters should be stripped from any token and *not* 
-        # inserted into a sentence.
-        r = len(_tokens)
-        i = 0
+        preserve = [ self._resolve_parser(f)
+                     for f in self.config.preserve_token ]
         
-        while i < r:
-            ignore = False
-            for f in self.config.preserve_token:
-                if eval(f)(_tokens[i]): ignore = True
+        while True:
+            if pending:
+                token = pending.pop()
+            else:
+                try:
+                    token = next(tokens)
+                except StopIteration:
+                    break
             
-            match = re.search(self.regex['punc'], _tokens[i], re.U)
-            if not ignore and match:    # 'punc' regex uses second match to
-                                        # store captured punctuation
-                # store punctuation and parse it
-                p           = match.group(2)
-                _tokens[i]   = re.sub(self.regex['punc'], '\\1 \\3',
-                                     _tokens[i], re.U)
-                insert = _tokens[i].split()
+            if skip:
+                skip -= 1
+            else:
+                if splits is None:
+                    insert = self._split_token(token, preserve)
+                else:
+                    try:
+                        insert = splits[token]
+                    except KeyError:
+                        insert = splits[token] = self._split_token(token,
+                                                                   preserve)
                 
-                if not re.match(self.regex['strip'], p, re.U):
-                    insert.insert(1, p)
+                if insert is not None:
+                    # the pieces take the token's place in the sentence.
+                    # scanning resumes two places further on, so the next
+                    # two tokens are passed through as they are.
+                    pending.extend(reversed(insert))
+                    skip    = 2
+                    continue
+            
+            if not token == '':
+                sent.append(token)
+        
+        return sent
     
-                # and insert the punctuation after current token
-                i += 1
-                r += len(insert) - 1
-                _tokens = _tokens[:i - 1] + insert + _tokens[i:]
+    def _split_token(self, token, preserve):
+        """
+        Return the pieces _replace_punctuation splits token into as a
+        tuple, or None if the token is preserved or has no punctuation.
+        """
+        if any(f(token) for f in preserve):
+            return None
+        
+        match = self._classifier.patterns['punc'].search(token)
+        if not match:
+            return None
+        
+        # 'punc' regex uses second match to store captured punctuation. 
+        # re.U here ends up as the count argument to re.sub, which limits 
+        # a token to 32 substitutions.
+        p       = match.group(2)
+        insert  = re.sub(self.regex['punc'], '\\1 \\3', token, re.U).split()
+        
+        if not self._classifier.patterns['strip'].match(p):
+            insert.insert(1, p)
+        return tuple(insert)
     
-            i += 1
+    def _replace_punctuation_spans(self, scanned, encoding = None):
+        """
+        _replace_punctuation for span mode. scanned is a list of (token,
+        start, end) tuples, and the sentence is returned in the same form,
+        with the pieces of each split token given their own offsets. If
+        encoding is set, the offsets count bytes of the encoded input.
+        """
+        sent     = [ ]
+        pending  = [ ]
+        skip     = 0
+        scanned  = iter(scanned)
+        splits   = { }
         
-        _tokens  = [ token for token in _tokens if not token == '' ]
-
-        return _tokens
+        preserve = [ self._resolve_parser(f)
+                     for f in self.config.preserve_token ]
+        
+        while True:
+            if pending:
+                token, start, end = pending.pop()
+            else:
+                try:
+                    token, start, end = next(scanned)
+                except StopIteration:
+                    break
+            
+            if skip:
+                skip -= 1
+            else:
+                try:
+                    pieces = splits[token]
+                except KeyError:
+                    pieces = splits[token] = self._split_offsets(token,
+                                                                 preserve)
+                
+                if pieces is not None:
+                    for i, j in reversed(pieces):
+                        piece = token[i:j]
+                        if encoding is not None:
+                            i = len(token[:i].encode(encoding))
+                            j = i + len(piece.encode(encoding))
+                        pending.append((piece, start + i, start + j))
+                    skip    = 2
+                    continue
+            
+            if not token == '':
+                sent.append((token, start, end))
+        
+        return sent
+    
+    def _split_offsets(self, token, preserve):
+        """
+        Return the (start, end) offsets within token of each piece that
+        _split_token splits it into, in the same order, or None if it is
+        not split. re.sub in _split_token replaces the punctuation
+        character of each of the first 32 matches of the 'punc' regex with
+        a space, so the pieces are the runs of non-whitespace between
+        those characters, with the first punctuation character put second.
+        """
+        if any(f(token) for f in preserve):
+            return None
+        
+        match = self._classifier.patterns['punc'].search(token)
+        if not match:
+            return None
+        
+        pieces  = [ ]
+        last    = 0
+        cuts    = [ m.start(2) for m in itertools.islice(
+                        re.finditer(self.regex['punc'], token), 32) ]
+        for cut in cuts + [ len(token) ]:
+            pieces.extend(m.span() for m
+                          in self._nonspace.finditer(token, last, cut))
+            last = cut + 1
+        
+        if not self._classifier.patterns['strip'].match(match.group(2)):
+            pieces.insert(1, match.span(2))
+        return tuple(pieces)
     
     def _is_emoticon(self, token):
-        return re.match(self.regex['emoticon'], token, re.U)
+        return 'emoticon' in self._tag(token)
     
     def _is_email(self, token):
-        return re.match(self.regex['email'], token, re.I | re.U)
+        return 'email' in self._tag(token)
     
     def _is_word(self, token):
-        return re.match('^\w*$', token, re.U)
+        return 'word' in self._tag(token)
 
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+# file: token_spans.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# token lists stored as offsets into the source text
+"""
+A read-only sequence of tokens stored as (start, end) offsets into a source
+string or buffer. The offsets are kept in two arrays, and each token is
+only sliced out of the source when it is looked up. TokenParser uses it
+for its TokenDict in span mode.
+"""
+
+from array import array
+
+try:
+    from itertools import izip as zip
+except ImportError:                         # python 3
+    pass
+
+
+def _typecode(source):
+    """
+    Return the smallest array typecode that can hold an offset into
+    source.
+    """
+    if len(source) <= 0xffffffff and array('I').itemsize >= 4:
+        return 'I'
+    return 'L'
+
+
+class TokenSpans(object):
+    """
+    Looking up an index returns the token source[start:end], decoded with
+    encoding if it is set and then passed through form if it is set (i.e.
+    lowercased for the clean list). Slices return lists of tokens, and a
+    TokenSpans compares equal to a list of the same tokens.
+
+    Attributes:
+        source      the string or buffer the offsets are into.
+        starts      array of token start offsets.
+        ends        array of token end offsets.
+        encoding    the encoding of a byte source, or None.
+        form        function applied to each token, or None.
+    """
+
+    source      = None
+    starts      = None
+    ends        = None
+    encoding    = None
+    form        = None
+
+    def __init__(self, source, encoding = None, form = None):
+        self.source     = source
+        self.starts     = array(_typecode(source))
+        self.ends       = array(_typecode(source))
+        self.encoding   = encoding
+        self.form       = form
+
+    def add(self, start, end):
+        """
+        Append the token at source[start:end].
+        """
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def spans(self):
+        """
+        Return a list of the (start, end) offsets of the tokens.
+        """
+        return list(zip(self.starts, self.ends))
+
+    def _token(self, start, end):
+        token = self.source[start:end]
+        if self.encoding is not None:
+            token = token.decode(self.encoding)
+        if self.form is not None:
+            token = self.form(token)
+        return token
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [ self._token(start, end) for start, end
+                     in zip(self.starts[i], self.ends[i]) ]
+        return self._token(self.starts[i], self.ends[i])
+
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield self._token(start, end)
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, tuple, TokenSpans)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __repr__(self):
+        return repr(list(self))
+
+    __hash__ = None
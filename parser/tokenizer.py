@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+# file: tokenizer.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# whitespace tokenizer with offsets
+"""
+Splits text into tokens in a single pass with one compiled regex, giving
+the offsets of each token in the input. Unlike str.split(" "), runs of
+whitespace of any kind (tabs, newlines) separate tokens and no empty
+tokens are produced.
+
+The input may be a string or any buffer the re module can scan, such as a
+bytes object or an mmap'd file; tokens are found with finditer() directly
+on the buffer, so only the tokens themselves are copied out of it.
+
+    tokenizer = Tokenizer()
+    for token, start, end in tokenizer.scan(text):
+        ...
+
+tag() also tags each token with the classes it belongs to, i.e. url,
+email, ticker or emoticon, as it is scanned, using a Classifier (see
+classifier.py) or any classify function. TokenParser uses a Tokenizer for
+string and buffer input when its tokenizer attribute is set, and tags the
+tokens with its own regexes in the same pass.
+"""
+
+import re
+
+
+class Tokenizer():
+    """
+    Attributes:
+        token_regex     the regex a token must match; by default any run of
+                        non-whitespace characters.
+        encoding        if set, tokens scanned from a byte buffer are
+                        decoded with it. offsets are always positions in
+                        the buffer, so they count bytes for a byte buffer
+                        and characters for a unicode string.
+        classifier      the Classifier used by tag().
+    """
+
+    token_regex     = r'\S+'
+    encoding        = None
+    classifier      = None
+
+    def __init__(self, classifier = None, encoding = None):
+        self.classifier = classifier
+        if encoding is not None:
+            self.encoding = encoding
+
+        self._text      = re.compile(self.token_regex, re.U)
+        self._bytes     = re.compile(self.token_regex.encode('ascii'))
+
+    def _pattern(self, buffer):
+        """
+        Return the compiled regex to scan buffer with: the bytes pattern
+        for python 3 byte buffers and the text pattern otherwise.
+        """
+        if isinstance(buffer, (str, type(u''))):
+            return self._text
+        return self._bytes
+
+    def scan(self, buffer, start = 0, end = None):
+        """
+        Yield a (token, start, end) tuple for each token in buffer, in
+        order, such that buffer[start:end] is the token. start and end
+        limit the scan to part of the buffer.
+        """
+        if end is None:
+            end = len(buffer)
+
+        encoding = self.encoding
+        if isinstance(buffer, type(u'')):
+            encoding = None                     # already text
+
+        for match in self._pattern(buffer).finditer(buffer, start, end):
+            token = match.group()
+            if encoding is not None:
+                token = token.decode(encoding)
+            yield token, match.start(), match.end()
+
+    def tokens(self, buffer):
+        """
+        Return a list of the tokens in buffer.
+        """
+        if self.encoding is None or isinstance(buffer, type(u'')):
+            return self._pattern(buffer).findall(buffer)
+        return [ token for token, start, end in self.scan(buffer) ]
+
+    def tag(self, buffer, start = 0, end = None, classify = None):
+        """
+        Yield a (token, start, end, tags) tuple for each token in buffer,
+        where tags is the frozenset of classes classify gives the token;
+        by default, classify is the classifier's. Each distinct token is
+        only classified once per call.
+        """
+        if classify is None:
+            classify = self.classifier.classify
+        seen = { }
+
+        for token, start, end in self.scan(buffer, start, end):
+            tags = seen.get(token)
+            if tags is None:
+                tags = seen[token] = classify(token)
+            yield token, start, end, tags
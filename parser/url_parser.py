@@ -4,17 +4,269 @@
 # license: ISC / public domain dual-licensed
 #
 # url scanning token parser
+"""
+UrlParser pulls the sites and URLs out of a text's tokens and, given a
+title resolver, the titles of the pages they link to. UrlMacroParser
+indexes a collection of UrlParsers by site.
 
+URLs are split with a single compiled regex rather than urllib, and the
+hosts and URLs found are interned, so that every parser linking to the
+same site shares one string for it.
+"""
+
+import io
+import json
+import os
+import re
+
+from inverted_index import InvertedIndex
+from macro_parser import MacroParser
 from token_parser import TokenParser
 
+try:
+    from http.client import HTTPException
+except ImportError:                         # python 2
+    from httplib import HTTPException
+
+
+# splits a URL into scheme, host and path in one match; any user info and
+# port are skipped, and the path stops at the query or fragment.
+URL_PARTS   = re.compile(r'^(?:([a-zA-Z][\w+.-]*)://)?(?:[^@/?#\s]*@)?'
+                         r'([^:/?#\s]*)(?::\d*)?([^?#\s]*)', re.U)
+
+# punctuation stripped from around a URL, i.e. (http://example.com).
+WRAPPING    = '()[]{}<>"\'.,;:!?'
+
+# <title> of an HTML page
+TITLE       = re.compile(b'<title[^>]*>(.*?)</title', re.I | re.S)
+
+_interned   = { }
+INTERN_LIMIT = 65536                        # strings in the intern table
+
+
+def intern_string(s):
+    """
+    Return the interned copy of s. Unlike intern(), this works for unicode
+    strings under python 2. The table is emptied once it holds
+    INTERN_LIMIT strings.
+    """
+    try:
+        return _interned[s]
+    except KeyError:
+        if len(_interned) >= INTERN_LIMIT:
+            _interned.clear()
+        _interned[s] = s
+        return s
+
+
+def split_url(url):
+    """
+    Split a URL token into a normalized (scheme, host, path) triple:
+    surrounding punctuation is stripped, the scheme (http if there is
+    none) and host are lowercased, and a leading www. is dropped from the
+    host. The path has no trailing slash, except that an empty path is
+    '/'. The host is interned.
+    """
+    scheme, host, path = URL_PARTS.match(url.strip(WRAPPING)).groups()
+
+    host = host.lower().rstrip('.')
+    if host.startswith('www.'):
+        host = host[4:]
+
+    return ((scheme or 'http').lower(), intern_string(host),
+            path.rstrip('/') or '/')
+
+
+def domains(host):
+    """
+    Return host and each domain it is under, i.e. news.example.com and
+    example.com for news.example.com. Top-level domains and the parts of
+    IP addresses are not included.
+    """
+    labels = host.split('.')
+    if len(labels) < 3 or host.replace('.', '').isdigit():
+        return [ host ]
+    return [ '.'.join(labels[i:]) for i in range(len(labels) - 1) ]
+
+
+def fetch_title(url, timeout = 5, limit = 65536):
+    """
+    A title resolver that fetches url and returns the contents of its
+    <title> tag, or None if the page cannot be fetched or has no title.
+    At most limit bytes of the page are read.
+    """
+    try:
+        from urllib.request import urlopen
+        from html import unescape
+    except ImportError:                     # python 2
+        from urllib2 import urlopen
+        from HTMLParser import HTMLParser
+        unescape = HTMLParser().unescape
+
+    try:
+        page = urlopen(url, timeout = timeout)
+        try:
+            data = page.read(limit)
+        finally:
+            page.close()
+    except (EnvironmentError, ValueError, HTTPException):
+        return None
+
+    match = TITLE.search(data)
+    if not match:
+        return None
+
+    title = ' '.join(match.group(1).decode('utf-8', 'replace').split())
+    return unescape(title) or None
+
+
+class TitleCache():
+    """
+    A title resolver that remembers the titles found by another resolver,
+    i.e. TitleCache('titles.json', fetch_title). Each title is appended to
+    the file at path as a line of JSON as soon as it is resolved, and the
+    file is read back when the cache is created, so titles are kept across
+    runs. Failed lookups are cached as well, so each URL is only resolved
+    once.
+    """
+
+    path        = None
+    resolver    = None
+
+    def __init__(self, path, resolver):
+        self.path       = path
+        self.resolver   = resolver
+        self.titles     = { }
+
+        if not os.path.exists(path):
+            return
+
+        with io.open(path, encoding = 'utf-8') as lines:
+            for line in lines:
+                try:
+                    entry = json.loads(line)
+                except ValueError:          # i.e. a line cut short
+                    continue
+                self.titles[entry['url']] = entry['title']
+
+    def __call__(self, url):
+        try:
+            return self.titles[url]
+        except KeyError:
+            pass
+
+        title = self.titles[url] = self.resolver(url)
+        with io.open(self.path, 'a', encoding = 'utf-8') as f:
+            f.write(json.dumps({ 'url': url, 'title': title }) + u'\n')
+        return title
+
+
 class UrlParser(TokenParser):
-    def __init__(self, tokens):
-        TokenParser.__init__(self, tokens)
+    """
+    A TokenParser that recognizes http and https URLs and adds three keys
+    to the TokenDict:
+        sites:      the host of each URL, lowercased and without www.
+        urls:       each URL as its host and path, i.e.
+                    example.com/news; the scheme, port, query and fragment
+                    are dropped.
+        titles:     the titles of the URLs' pages, if title_resolver is
+                    set. Only titles that are found are listed.
+
+    title_resolver is a function taking a URL and returning the title of
+    its page or None, such as fetch_title; wrap it in a TitleCache to keep
+    the titles between runs. By default no titles are resolved.
+    """
+
+    title_resolver  = None
+
+    def __init__(self, tokens, lazy = None):
+        TokenParser.__init__(self, tokens, lazy)
 
     def _init_hooks(self):
-        self.regex['url'] = 'https?://(\\w)+\.(\\w)(([\\w/.]*)*)'
+        self.regex = dict(self.regex,
+                          url = r'https?://(\w)+\.(\w)(([\w/.]*)*)')
 
         self.TokenDict['sites']     = [ ]
+        self.TokenDict['urls']      = [ ]
         self.TokenDict['titles']    = [ ]
 
+    def _post_hooks(self):
+        sites   = [ ]
+        urls    = [ ]
+        titles  = [ ]
+
+        resolve = self.title_resolver
+        if getattr(resolve, '__self__', None) is self:
+            resolve = resolve.__func__      # a function set on the class
+
+        for token in self.TokenDict['tokens']:
+            if not self._is_url(token):
+                continue
+
+            scheme, host, path = split_url(token)
+            sites.append(host)
+            urls.append(intern_string(host + path.rstrip('/')))
+
+            if resolve is not None:
+                title = resolve('%s://%s%s' % (scheme, host, path))
+                if title:
+                    titles.append(title)
+
+        self.TokenDict['sites']     = sites
+        self.TokenDict['urls']      = urls
+        self.TokenDict['titles']    = titles
+
+    def sites(self):
+        return self.TokenDict['sites']
+
+    def sites_str(self):
+        return ' '.join(self.TokenDict['sites'])
+
+    def urls(self):
+        return self.TokenDict['urls']
+
+    def urls_str(self):
+        return ' '.join(self.TokenDict['urls'])
+
+    def titles(self):
+        return self.TokenDict['titles']
+
+    def titles_str(self):
+        return ' '.join(self.TokenDict['titles'])
+
+
+class UrlMacroParser(MacroParser):
+    """
+    A MacroParser of UrlParsers that indexes each imported parser under
+    the sites it links to, and every domain they are under, so that
+    get_site('example.com') finds the parsers linking to example.com or
+    news.example.com without scanning the collection. Only parsers kept in
+    Parsers are indexed, so texts loaded with load_stream or in parallel
+    are counted but cannot be looked up.
+    """
+
+    SiteIndex   = None                      # an InvertedIndex of domains
+
+    def _init_hooks(self):
+        self.DefaultParserClass = UrlParser
+        self.SiteIndex          = InvertedIndex()
+
+    def _index_parser(self, doc, p):
+        MacroParser._index_parser(self, doc, p)
+        self.SiteIndex.add(doc, [ domain
+                                  for host in p.TokenDict.get('sites', [ ])
+                                  for domain in domains(host) ])
+
+    def get_site(self, domain):
+        """
+        Return the parsers linking to domain or any domain under it, in
+        the order they were imported.
+        """
+        scheme, host, path = split_url(domain)
+        return [ self.Parsers[doc] for doc in self.SiteIndex.get(host) ]
 
+    def get_sites(self):
+        """
+        Return a list of the indexed domains.
+        """
+        return list(self.SiteIndex.postings)
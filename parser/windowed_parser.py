@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# file: windowed_parser.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# MacroParser over a moving window of time
+"""
+A MacroParser whose distributions only count the texts in a recent window
+of time, i.e. "top tickers in the last 15 minutes".
+"""
+
+import collections
+import time
+
+from collections import Counter
+
+from distribution import CounterDistribution
+from macro_parser import MacroParser, _counted
+
+
+class WindowedMacroParser(MacroParser):
+    """
+    Each text is counted in a bucket of BucketSeconds by its timestamp, and
+    the distributions hold the sum of the buckets in the current window:
+        sliding                 -   the last WindowBuckets buckets, up to
+                                    and including the newest.
+        tumbling                -   (Tumbling = True) consecutive, non-
+                                    overlapping blocks of WindowBuckets
+                                    buckets; the window is emptied when
+                                    the next block starts.
+    With the defaults, the window is the last 15 minutes, one minute at a
+    time.
+
+    Time only moves forward: the clock is the newest timestamp seen, or a
+    later time given to advance(now). When it moves past a bucket, the
+    bucket's counts are subtracted from the distributions and the bucket
+    is dropped, so the cost of expiring depends only on the size of the
+    bucket, and memory and the cost of get_top only on the size of the
+    window, never on the length of the history. A text whose bucket has
+    already expired is not counted; late counts the texts dropped this
+    way.
+
+    Texts are imported with a timestamp in seconds (as from time.time())
+    by import_parser(p, timestamp), import_raw(text, timestamp) or
+    load_timed(items), which takes (timestamp, text) pairs. Any other way
+    of loading texts, including parallel loads, stamps them with the
+    current time. Parsers are never kept, so get_parsers() is empty.
+
+    The data access functions answer for the current window; get_top,
+    get_count and get_fd also take now, to advance the clock first. The
+    window is window(), and get_series(key, token) gives the count of a
+    token in each bucket in the window.
+
+    Window counts are always exact (CounterDistribution), as sketches
+    cannot have counts taken away; DistributionClass,
+    DerivedDistributionClass and DistributionClasses are ignored, and
+    n-grams and pairs are bounded only by the size of the window.
+    """
+
+    BucketSeconds       = 60
+    WindowBuckets       = 15
+    Tumbling            = False
+
+    now                 = None      # the clock: newest timestamp seen
+    late                = 0         # texts dropped as too old
+
+    def _init_hooks(self):
+        """
+        Set up the buckets. Derived classes that override _init_hooks must
+        call this one.
+        """
+        self._buckets   = { }       # bucket index -> { key: Counter }
+
+    def _bucket(self, timestamp):
+        return int(timestamp // self.BucketSeconds)
+
+    def _start(self, index):
+        """
+        Return the index of the first bucket in the window whose newest
+        bucket is index.
+        """
+        if self.Tumbling:
+            return index - index % self.WindowBuckets
+        return index - self.WindowBuckets + 1
+
+    def _distribution(self, key):
+        if not key in self.Distributions:
+            self.Distributions[key]     = CounterDistribution()
+            self.DistributionKeys.append(key)
+        return self.Distributions[key]
+
+    def advance(self, now = None):
+        """
+        Move the clock forward to now (the current time if None) and expire
+        the buckets that have left the window. An earlier time than the
+        clock is ignored.
+        """
+        if now is None:
+            now = time.time()
+        if self.now is not None and now <= self.now:
+            return
+        self.now    = now
+
+        start       = self._start(self._bucket(now))
+        expired     = [ index for index in self._buckets if index < start ]
+        if expired and len(expired) == len(self._buckets):
+            # everything expires, i.e. at the start of a tumbling window:
+            # clear rather than subtract.
+            for key in self.DistributionKeys:
+                self.Distributions[key] = CounterDistribution()
+            self._buckets.clear()
+            return
+
+        for index in expired:
+            for key, counts in self._buckets.pop(index).items():
+                self.Distributions[key].remove_counts(counts)
+
+    def _add(self, counted, timestamp):
+        """
+        Count a list of (key, tokens) pairs in the bucket for timestamp.
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        self.advance(timestamp)
+
+        index = self._bucket(timestamp)
+        if index < self._start(self._bucket(self.now)):
+            self.late += 1
+            return
+
+        bucket = self._buckets.setdefault(index, { })
+        for key, tokens in counted:
+            counts = Counter(tokens)
+            if not key in bucket:
+                bucket[key] = Counter()
+            bucket[key].update(counts)
+            self._distribution(key).add_counts(counts)
+
+    def import_parser(self, p, timestamp = None):
+        """
+        Count a single TokenParser at timestamp (now if None).
+        """
+        self._count_parser(p, timestamp)
+
+    def import_raw(self, text, timestamp = None):
+        self.import_parser(self.DefaultParserClass(text), timestamp)
+
+    def load_timed(self, items):
+        """
+        Load an iterable of (timestamp, text) pairs.
+        """
+        stamps = collections.deque()
+
+        def texts():
+            for timestamp, text in items:
+                stamps.append(timestamp)
+                yield text
+
+        for p in self.DefaultParserClass.parse_many(texts()):
+            self._count_parser(p, stamps.popleft())
+
+    def _count_parser(self, p, timestamp = None):
+        self._add(_counted(p, self._spec()), timestamp)
+
+    def _merge_counts(self, counts):
+        self._add(counts, None)
+
+    def merge(self, other):
+        raise TypeError('windowed distributions cannot be merged')
+
+    def load(self, path, mapped = True):
+        raise TypeError('windowed distributions cannot be loaded')
+
+    def window(self):
+        """
+        Return the (start, end) times of the current window, or None if
+        nothing has been counted yet.
+        """
+        if self.now is None:
+            return None
+        index = self._bucket(self.now)
+        return (self._start(index) * self.BucketSeconds,
+                (index + 1) * self.BucketSeconds)
+
+    def get_series(self, key, token):
+        """
+        Return a list of (bucket start time, count) pairs for token in key,
+        one for each bucket in the window that has counted anything.
+        """
+        return [ (index * self.BucketSeconds,
+                  self._buckets[index].get(key, { }).get(token, 0))
+                 for index in sorted(self._buckets) ]
+
+    def get_fd(self, key, n = None, now = None):
+        if now is not None:
+            self.advance(now)
+        return MacroParser.get_fd(self, key, n)
+
+    def get_count(self, key, token, now = None):
+        if now is not None:
+            self.advance(now)
+        return MacroParser.get_count(self, key, token)
+
+    def get_top(self, key, n = 10, now = None):
+        if now is not None:
+            self.advance(now)
+        return MacroParser.get_top(self, key, n)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# file: test_async_loader.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for AsyncLoader, driven by an in-process fake stream
+"""
+AsyncLoader requires python 3.6 or later (async generators), as does this
+module.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from async_loader import AsyncLoader
+from benchmark import corpus
+from macro_parser import MacroParser
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+async def stream(texts, pause = None, fail_after = None, on_text = None):
+    """
+    A fake live stream: yields texts, sleeping pause seconds after each
+    one (or only yielding to the event loop if pause is None), and raising
+    IOError after fail_after texts if it is set.
+    """
+    for i, text in enumerate(texts):
+        if fail_after is not None and i == fail_after:
+            raise IOError('stream closed')
+        if on_text is not None:
+            on_text(i)
+        yield text
+        await asyncio.sleep(pause or 0)
+
+
+class AsyncLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = corpus(500)
+
+    def counts(self, macro):
+        return dict((key, dict(dist.items()))
+                    for key, dist in macro.Distributions.items())
+
+    def test_counts_match_load_raw(self):
+        expected = MacroParser()
+        expected.load_raw(self.texts)
+
+        for workers in (1, 3):
+            loader = AsyncLoader(MacroParser(), batch_size = 32,
+                                 workers = workers)
+            macro  = run(loader.run(stream(self.texts)))
+            self.assertEqual(self.counts(macro), self.counts(expected))
+            self.assertEqual(loader.texts, len(self.texts))
+            self.assertEqual(loader.batches, (len(self.texts) + 31) // 32)
+
+    def test_backpressure(self):
+        loader  = AsyncLoader(MacroParser(), batch_size = 10,
+                              queue_size = 1, workers = 1)
+        ahead   = [ ]
+
+        # texts read from the stream but not yet counted can only be in
+        # the batch being filled, the one waiting to be queued, the queue
+        # and the batches being parsed.
+        def on_text(i):
+            ahead.append(i - loader.texts)
+
+        run(loader.run(stream(self.texts, on_text = on_text)))
+        limit = loader.batch_size * (loader.queue_size + loader.workers + 1)
+        self.assertEqual(loader.texts, len(self.texts))
+        self.assertTrue(max(ahead) <= limit, (max(ahead), limit))
+
+    def test_snapshots(self):
+        snapshots = [ ]
+
+        async def publish(snapshot):
+            snapshots.append(snapshot)
+
+        loader = AsyncLoader(MacroParser(), batch_size = 20,
+                             snapshot_interval = 0.01, snapshot_top = 3,
+                             on_snapshot = publish)
+        run(loader.run(stream(self.texts[:200], pause = 0.001)))
+
+        self.assertTrue(len(snapshots) >= 2)
+        final = snapshots[-1]
+        self.assertEqual(final['texts'], 200)
+        self.assertEqual(final['batches'], 10)
+        self.assertEqual(sorted(final['distributions']),
+                         sorted(loader.macro.Distributions))
+        for top in final['distributions'].values():
+            self.assertTrue(len(top) <= 3)
+
+        seen = [ snapshot['texts'] for snapshot in snapshots ]
+        self.assertEqual(seen, sorted(seen))
+
+    def test_final_snapshot_after_error(self):
+        snapshots   = [ ]
+        loader      = AsyncLoader(MacroParser(), batch_size = 10,
+                                  on_snapshot = snapshots.append)
+
+        with self.assertRaises(IOError):
+            run(loader.run(stream(self.texts, fail_after = 55)))
+
+        self.assertEqual(len(snapshots), 1)
+        self.assertTrue(snapshots[0]['texts'] <= 50)
+        self.assertEqual(snapshots[0]['texts'], loader.texts)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# file: test_classifier.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for the combined regex Classifier
+
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus, zipf_corpus
+from classifier import Classifier
+from token_parser import TokenParser
+
+
+def classify_alone(regex, flags, exclude, token):
+    """
+    Tag token by matching each regex on its own, as the classifier should.
+    """
+    return frozenset(name for name in regex if not name in exclude and
+                     re.match(regex[name], token, re.U | flags.get(name, 0)))
+
+
+class DoubleParser(TokenParser):
+    """
+    Tags two-character tokens made of one repeated character as special.
+    """
+
+    def _init_hooks(self):
+        self.regex = dict(self.regex, zdouble = r'^(\w)\1$')
+        self.config.pre_tparsers.append('self._is_zdouble')
+
+    def _is_zdouble(self, token):
+        return 'zdouble' in self._tag(token)
+
+
+class ClassifierTest(unittest.TestCase):
+
+    def check(self, regex, tokens, flags = None, exclude = None):
+        flags       = flags or { }
+        exclude     = exclude or [ ]
+        classifier  = Classifier(regex, flags, exclude)
+        for token in tokens:
+            self.assertEqual(classifier.classify(token),
+                             classify_alone(regex, flags, exclude, token),
+                             token)
+
+    def test_token_parser_regexes(self):
+        tokens = set(' '.join(corpus(200) + zipf_corpus(200)).split(' '))
+        tokens.update([ '', 'FOO@EXAMPLE.COM', '($GOOG)', ':-D' ])
+        self.check(TokenParser.regex, sorted(tokens), TokenParser.regex_flags,
+                   TokenParser.regex_rewrite)
+
+    def test_backreferences(self):
+        regex = {
+            'double':       r'^(\w)\1$',
+            'named':        r'^(?P<c>\w)x(?P=c)$',
+            'conditional':  r'^(\()?\w+(?(1)\))$',
+            'word':         r'^\w+$',
+            'pair':         r'^(\w)(\w)$',
+        }
+        self.check(regex, [ 'aa', 'ab', 'axa', 'axb', '(ab)', '(ab', 'ab)',
+                            'a', '', 'zz', '((' ])
+
+    def test_backreference_parser(self):
+        p = DoubleParser('aa ab zz ee e http://x.co')
+        self.assertEqual(p.special(), [ 'http://x.co', 'aa', 'zz', 'ee' ])
+
+    def test_conflicting_groups(self):
+        regex = { 'one': r'^(?P<x>a)', 'two': r'^(?P<x>b)', 'three': r'c$' }
+        self.check(regex, [ 'a', 'b', 'c', 'abc', 'bc' ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# file: test_distribution.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for the MacroParser distribution backends
+
+import gc
+import os
+import pickle
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import zipf_corpus
+from distribution import CompactDistribution, CounterDistribution
+from macro_parser import MacroParser
+
+try:
+    import tracemalloc
+except ImportError:                         # python 2
+    tracemalloc = None
+
+
+def build(backend, texts):
+    """
+    Count the words of texts into a new backend, splitting each text as
+    it is counted so that no token strings outlive the loop but those the
+    backend keeps.
+    """
+    dist = backend()
+    for text in texts:
+        dist.update(text.lower().split(' '))
+    return dist
+
+
+class CompactDistributionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts  = zipf_corpus(500)
+        self.exact  = Counter(token for text in self.texts
+                              for token in text.lower().split(' '))
+
+    def test_counts(self):
+        dist = build(CompactDistribution, self.texts)
+        self.assertEqual(dict(dist.items()), dict(self.exact))
+        self.assertEqual(len(dist), len(self.exact))
+        self.assertEqual(dist.total(), sum(self.exact.values()))
+        for token in list(self.exact)[:200] + [ 'missing', '' ]:
+            self.assertEqual(dist.count(token), self.exact[token])
+        self.assertEqual([ count for token, count in dist.most_common(20) ],
+                         [ count for token, count
+                           in self.exact.most_common(20) ])
+
+    def test_unicode_and_bytes(self):
+        dist = CompactDistribution()
+        dist.update([ u'caf\xe9', u'caf\xe9', u'—', '' ])
+        dist.add_counts({ u'caf\xe9'.encode('utf-8'): 3 })
+        self.assertEqual(dist.count(u'caf\xe9'), 5)
+        self.assertEqual(dist.count(u'—'), 1)
+        self.assertEqual(dist.count(''), 1)
+        self.assertEqual(sorted(dist.items()),
+                         [ (u'', 1), (u'caf\xe9', 5), (u'—', 1) ])
+
+    def test_large_counts(self):
+        dist = CompactDistribution()
+        dist.update([ 'a', 'b' ])
+        dist.add_counts({ 'a': 2 ** 32, 'c': 2 ** 40 })
+        dist.add_counts({ 'a': 2 ** 32 })
+        self.assertEqual(dict(dist.items()),
+                         { 'a': 2 ** 33 + 1, 'b': 1, 'c': 2 ** 40 })
+
+    def test_merge_and_pickle(self):
+        half    = len(self.texts) // 2
+        dist    = build(CompactDistribution, self.texts[:half])
+        dist.merge(build(CounterDistribution, self.texts[half:]))
+        dist    = pickle.loads(pickle.dumps(dist))
+        dist.update([ 'new', 'new' ])
+
+        expected = self.exact + Counter({ 'new': 2 })
+        self.assertEqual(dict(dist.items()), dict(expected))
+        self.assertEqual(dist.count('new'), 2)
+
+    def test_macro_parser(self):
+        macro = MacroParser()
+        macro.DistributionClass = CompactDistribution
+        macro.load_raw(self.texts[:100])
+        expected = MacroParser()
+        expected.load_raw(self.texts[:100])
+        for key in expected.DistributionKeys:
+            self.assertEqual(dict(macro.Distributions[key].items()),
+                             dict(expected.Distributions[key].items()))
+
+    @unittest.skipIf(tracemalloc is None, 'needs tracemalloc')
+    def test_smaller_than_counter(self):
+        sizes = { }
+        for backend in (CounterDistribution, CompactDistribution):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                dist = build(backend, self.texts)
+                sizes[backend] = tracemalloc.get_traced_memory()[0]
+            finally:
+                tracemalloc.stop()
+            del dist
+
+        self.assertTrue(2 * sizes[CompactDistribution] <
+                        sizes[CounterDistribution], sizes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# file: test_freq_index.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for the on-disk frequency index and MacroParser.save and load
+
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import zipf_corpus
+from distribution import CounterDistribution
+from freq_index import MappedDistribution, load_index, merge_index, save_index
+from macro_parser import MacroParser
+
+
+def distribution(counts):
+    dist = CounterDistribution()
+    dist.add_counts(counts)
+    return dist
+
+
+def counts(macro):
+    return dict((key, dict(macro.Distributions[key].items()))
+                for key in macro.DistributionKeys)
+
+
+class FreqIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir    = tempfile.mkdtemp()
+        self.texts  = zipf_corpus(300)
+        self.macro  = MacroParser()
+        self.macro.load_raw(self.texts)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def test_round_trip(self):
+        self.macro.save(self.path('index'))
+        loaded = MacroParser()
+        loaded.load(self.path('index'))
+
+        self.assertEqual(loaded.DistributionKeys, self.macro.DistributionKeys)
+        self.assertEqual(counts(loaded), counts(self.macro))
+        for key in self.macro.DistributionKeys:
+            mapped  = loaded.Distributions[key]
+            exact   = self.macro.Distributions[key]
+            self.assertTrue(isinstance(mapped, MappedDistribution))
+            self.assertEqual(len(mapped), len(exact))
+            for token, count in list(exact.items())[:100]:
+                self.assertEqual(mapped.count(token), count)
+            self.assertEqual(mapped.count('not a token'), 0)
+            self.assertEqual([ count for token, count
+                               in mapped.most_common(25) ],
+                             [ count for token, count
+                               in exact.most_common(25) ])
+            self.assertEqual(sorted(mapped.most_common()),
+                             sorted(exact.items()))
+
+    def test_unicode_and_empty(self):
+        save_index(self.path('index'), [
+            ('words', distribution({ u'caf\xe9': 3, u'—': 1, '': 2 })),
+            ('empty', distribution({ })) ])
+        (key, words), (empty_key, empty) = load_index(self.path('index'))
+
+        self.assertEqual((key, empty_key), ('words', 'empty'))
+        self.assertEqual(dict(words.items()),
+                         { u'caf\xe9': 3, u'—': 1, u'': 2 })
+        self.assertEqual(words.count(u'caf\xe9'), 3)
+        self.assertEqual(words.most_common(1), [ (u'caf\xe9', 3) ])
+        self.assertEqual((len(empty), list(empty.items())), (0, [ ]))
+        self.assertEqual(empty.most_common(5), [ ])
+
+    def test_integer_sizes(self):
+        small   = { 'a': 5, 'b': 2 ** 32 - 1 }
+        large   = { 'a': 5, 'b': 2 ** 40 }
+        save_index(self.path('small'), [ ('key', distribution(small)) ])
+        save_index(self.path('large'), [ ('key', distribution(large)) ])
+
+        for name, expected, size in (('small', small, 4), ('large', large, 8)):
+            (key, dist), = load_index(self.path(name))
+            self.assertEqual(dict(dist.items()), expected)
+            self.assertEqual(dist.most_common(1), [ ('b', expected['b']) ])
+            self.assertEqual(dist._offsets[1], 4)
+            self.assertEqual(dist._counts[1], size)
+            self.assertEqual(dist._rank[1], 4)
+
+        # only the count table is wider
+        self.assertEqual(os.path.getsize(self.path('large')) -
+                         os.path.getsize(self.path('small')), 2 * 4)
+
+    def test_not_an_index(self):
+        with open(self.path('bad'), 'wb') as f:
+            f.write(b'BNLPIDX1' + struct.pack('<I', 0))
+        self.assertRaises(ValueError, load_index, self.path('bad'))
+
+    def test_merge_index(self):
+        shards = [ ]
+        for i in range(3):
+            macro = MacroParser()
+            macro.load_raw(self.texts[i::3])
+            shards.append(self.path('shard%d' % i))
+            macro.save(shards[-1])
+
+        merge_index(self.path('merged'), shards)
+        merged = MacroParser()
+        merged.load(self.path('merged'))
+        self.assertEqual(sorted(merged.DistributionKeys),
+                         sorted(self.macro.DistributionKeys))
+        self.assertEqual(counts(merged), counts(self.macro))
+
+    def test_load_unmapped(self):
+        self.macro.save(self.path('index'))
+        macro = MacroParser()
+        macro.load_raw(self.texts)
+        macro.load(self.path('index'), mapped = False)
+
+        for key in self.macro.DistributionKeys:
+            self.assertFalse(macro.Distributions[key].read_only)
+            self.assertEqual(dict(macro.Distributions[key].items()),
+                             dict((token, 2 * count) for token, count
+                                  in self.macro.Distributions[key].items()))
+
+    def test_write_copies_mapped(self):
+        self.macro.save(self.path('index'))
+        macro = MacroParser()
+        macro.load(self.path('index'))
+        mapped = macro.Distributions['clean']
+        self.assertRaises(TypeError, mapped.add_counts, { 'a': 1 })
+
+        macro.import_raw(self.texts[0])
+        copied = macro.Distributions['clean']
+        self.assertFalse(copied is mapped)
+        self.assertFalse(copied.read_only)
+
+        expected    = Counter(dict(self.macro.Distributions['clean'].items()))
+        extra       = MacroParser()
+        extra.import_raw(self.texts[0])
+        expected.update(dict(extra.Distributions['clean'].items()))
+        self.assertEqual(dict(copied.items()), dict(expected))
+
+        # the file and the mapped view are unchanged
+        (key, dist), = [ item for item in load_index(self.path('index'))
+                         if item[0] == 'clean' ]
+        self.assertEqual(dict(dist.items()),
+                         dict(self.macro.Distributions['clean'].items()))
+        self.assertEqual(dict(mapped.items()), dict(dist.items()))
+
+        merged = MacroParser()
+        merged.load(self.path('index'))
+        merged.merge(extra)
+        self.assertEqual(counts(merged)['clean'], dict(expected))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# file: test_inverted_index.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for InvertedIndex and its posting lists, checked by brute force
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from inverted_index import (BLOCK, InvertedIndex, PostingList, load_postings,
+                            save_postings)
+
+
+def random_index(docs = 3000, seed = 0):
+    """
+    Return an InvertedIndex of docs random documents and the token sets
+    it was built from. Token t0 is in every other document, so its list
+    is long; the t1xx tokens are rare.
+    """
+    rand    = random.Random(seed)
+    index   = InvertedIndex()
+    sets    = [ ]
+
+    for doc in range(docs):
+        tokens = set('t%d' % int(rand.paretovariate(0.8))
+                     for i in range(rand.randint(0, 6)))
+        if doc % 2:
+            tokens.add('t0')
+        if rand.random() < 0.05:
+            tokens.add('t1%02d' % rand.randrange(10))
+        index.add(doc, tokens)
+        sets.append(tokens)
+
+    return index, sets
+
+
+class PostingListTest(unittest.TestCase):
+
+    def test_append_and_widen(self):
+        postings    = PostingList()
+        ids         = [ 0, 3, 300, 70000, 70001, 2 ** 31 + 5 ]
+        for doc in ids:
+            postings.append(doc)
+        self.assertEqual(list(postings), ids)
+        self.assertEqual(postings.last, ids[-1])
+        self.assertEqual(postings.gaps.itemsize, 4)
+        self.assertRaises(ValueError, postings.append, ids[-1])
+
+    def test_skips(self):
+        for size in (1, BLOCK - 1, BLOCK, BLOCK + 1, 5 * BLOCK + 7):
+            postings    = PostingList()
+            ids         = list(range(5, 5 + 3 * size, 3))
+            for doc in ids:
+                postings.append(doc)
+            self.assertEqual(postings.starts, ids[::BLOCK])
+            self.assertEqual(PostingList(postings.gaps).starts, ids[::BLOCK])
+            for i in range(len(postings.starts)):
+                self.assertEqual(postings._block(i),
+                                 ids[i * BLOCK:(i + 1) * BLOCK])
+
+    def test_filter(self):
+        rand        = random.Random(1)
+        ids         = sorted(rand.sample(range(100000), 20 * BLOCK))
+        postings    = PostingList()
+        for doc in ids:
+            postings.append(doc)
+
+        members = set(ids)
+        for size in (0, 1, 5, 19, 500, 5000):
+            docs = sorted(set(rand.sample(range(100000), size) +
+                              rand.sample(ids, size // 2)))
+            self.assertEqual(postings.filter(docs),
+                             [ doc for doc in docs if doc in members ])
+
+    def test_filter_decodes_only_needed_blocks(self):
+        postings = PostingList()
+        for doc in range(0, 100 * BLOCK * 2, 2):
+            postings.append(doc)
+
+        decoded = [ ]
+        block   = postings._block
+
+        def record(i):
+            decoded.append(i)
+            return block(i)
+
+        postings._block = record
+        docs = [ 4, 6, 7, 50 * BLOCK * 2, 99 * BLOCK * 2 + 1 ]
+        self.assertEqual(postings.filter(docs), [ 4, 6, 50 * BLOCK * 2 ])
+        self.assertEqual(decoded, [ 0, 50, 99 ])
+
+
+class InvertedIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index, self.sets = random_index()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def queries(self):
+        rand    = random.Random(2)
+        vocab   = sorted(self.index.postings)
+        for i in range(300):
+            query = rand.sample(vocab, rand.randint(1, 3))
+            if i % 3 == 0:
+                query.append('t0')
+            if i % 50 == 0:
+                query.append('missing')
+            yield query
+
+    def test_against_brute_force(self):
+        index = self.index
+        for query in self.queries():
+            self.assertEqual(index.intersect(query),
+                             [ doc for doc, tokens in enumerate(self.sets)
+                               if tokens.issuperset(query) ], query)
+            self.assertEqual(index.union(query),
+                             [ doc for doc, tokens in enumerate(self.sets)
+                               if tokens.intersection(query) ], query)
+
+        self.assertEqual(index.intersect([ ]), [ ])
+        self.assertEqual(index.union([ ]), [ ])
+        self.assertEqual(index.get('missing'), [ ])
+        self.assertEqual(index.count('t0'), len(self.sets) // 2)
+        self.assertEqual(index.docs, len(self.sets))
+
+    def test_save_and_load(self):
+        path = os.path.join(self.dir, 'postings')
+        save_postings(path, [ ('clean', self.index),
+                              ('empty', InvertedIndex()) ])
+        loaded = load_postings(path)
+
+        self.assertEqual([ key for key, index in loaded ],
+                         [ 'clean', 'empty' ])
+        index = loaded[0][1]
+        self.assertEqual(index.docs, self.index.docs)
+        self.assertEqual(sorted(index.postings), sorted(self.index.postings))
+        for token, postings in self.index.postings.items():
+            self.assertEqual(list(index.postings[token]), list(postings))
+            self.assertEqual(index.postings[token].starts, postings.starts)
+            self.assertEqual(index.postings[token].last, postings.last)
+
+        for query in self.queries():
+            self.assertEqual(index.intersect(query),
+                             self.index.intersect(query))
+
+        doc = index.docs
+        index.add(doc, [ 't0', 'new' ])
+        self.assertEqual(index.get('t0')[-1], doc)
+        self.assertEqual(index.intersect([ 't0', 'new' ]), [ doc ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+# file: test_macro_parser.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for MacroParser loading and counting
+
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus, zipf_corpus
+from distribution import CounterDistribution
+from macro_parser import MacroParser
+from sketch import SketchDistribution
+from token_parser import TokenParser
+
+
+def counts(macro):
+    return dict((key, dict(macro.Distributions[key].items()))
+                for key in macro.DistributionKeys)
+
+
+class ParallelLoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts      = corpus(300)
+        self.expected   = MacroParser()
+        self.expected.load_raw(self.texts)
+
+    def test_load_raw(self):
+        for workers, chunksize in ((2, 7), (3, 50), (2, 1000)):
+            macro = MacroParser()
+            macro.load_raw(self.texts, workers = workers,
+                           chunksize = chunksize)
+            self.assertEqual(counts(macro), counts(self.expected))
+            self.assertEqual(macro.Parsers, [ ])
+
+    def test_load_stream(self):
+        macro = MacroParser()
+        macro.load_stream((text + '\n' for text in self.texts + self.texts),
+                          dedup = True, workers = 2, chunksize = 16)
+        self.assertEqual(counts(macro), counts(self.expected))
+
+    def test_window(self):
+        # a new chunk is read as each one is merged, so a slow chunk does
+        # not hold back the chunks queued behind it.
+        read    = [ ]
+        merged  = [ ]
+        macro   = MacroParser()
+        merge   = macro._merge_counts
+
+        def texts():
+            for i, text in enumerate(self.texts):
+                read.append(i)
+                yield text
+
+        def record(counts):
+            merged.append(len(read))
+            merge(counts)
+
+        macro._merge_counts = record
+        macro.load_raw(texts(), workers = 2, chunksize = 10)
+
+        chunks = len(self.texts) // 10
+        self.assertEqual(merged, [ min(chunks, 4 + i) * 10
+                                   for i in range(chunks) ])
+        self.assertEqual(counts(macro), counts(self.expected))
+
+
+class NGramTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts  = [ 'the cat sat on the mat',
+                        'the cat ran http://x.co $AAPL',
+                        'on the mat the cat sat http://x.co',
+                        '$AAPL http://y.co $AAPL :)' ]
+        self.exact  = { }
+        for text in self.texts:
+            p = TokenParser(text)
+            for key, n in (('clean', 2), ('clean', 3), ('sent', 2)):
+                tokens  = p.TokenDict[key]
+                grams   = [ ' '.join(tokens[i:i + n])
+                            for i in range(len(tokens) - n + 1) ]
+                self.exact.setdefault('%s.%dgram' % (key, n),
+                                      Counter()).update(grams)
+
+            special = sorted(set(p.TokenDict['special']))
+            self.exact.setdefault('special.pairs', Counter()).update(
+                '%s %s' % (a, b) for i, a in enumerate(special)
+                for b in special[i + 1:])
+
+    def macro(self, derived = SketchDistribution):
+        macro               = MacroParser()
+        macro.NGrams        = { 'clean': [ 2, 3 ], 'sent': [ 2 ] }
+        macro.CoOccurrence  = [ 'special' ]
+        macro.DerivedDistributionClass = derived
+        return macro
+
+    def check(self, macro, backend):
+        self.assertEqual(sorted(self.exact),
+                         sorted(key for key in macro.DistributionKeys
+                                if '.' in key))
+        for key in self.exact:
+            dist = macro.Distributions[key]
+            self.assertTrue(isinstance(dist, backend), key)
+            self.assertEqual(dict(dist.items()), dict(self.exact[key]), key)
+            self.assertEqual(macro.get_count(key, 'the cat'),
+                             self.exact[key]['the cat'])
+
+    def test_counts(self):
+        self.assertEqual(self.exact['clean.2gram']['the cat'], 3)
+        self.assertEqual(self.exact['clean.3gram']['on the mat'], 2)
+        self.assertEqual(self.exact['special.pairs'],
+                         Counter({ '$AAPL http://x.co': 1,
+                                   '$AAPL http://y.co': 1,
+                                   '$AAPL :)': 1, ':) http://y.co': 1 }))
+
+        for derived, backend in ((SketchDistribution, SketchDistribution),
+                                 (None, CounterDistribution)):
+            macro = self.macro(derived)
+            macro.load_raw(self.texts)
+            self.check(macro, backend)
+            self.assertTrue(isinstance(macro.Distributions['clean'],
+                                       CounterDistribution))
+
+    def test_parallel_and_stream(self):
+        for derived in (SketchDistribution, None):
+            macro = self.macro(derived)
+            macro.load_raw(self.texts * 3, workers = 2, chunksize = 2)
+            macro.load_stream(text + '\n' for text in self.texts)
+            self.exact = dict((key, Counter(dict((token, 4 * count)
+                                                 for token, count
+                                                 in counts.items())))
+                              for key, counts in self.exact.items())
+            self.check(macro, derived or CounterDistribution)
+            self.setUp()
+
+    def test_distribution_classes(self):
+        macro = self.macro()
+        macro.DistributionClasses = { 'clean.2gram': CounterDistribution }
+        macro.load_raw(self.texts)
+        self.assertTrue(isinstance(macro.Distributions['clean.2gram'],
+                                   CounterDistribution))
+        self.assertTrue(isinstance(macro.Distributions['clean.3gram'],
+                                   SketchDistribution))
+
+    def test_bounded(self):
+        # the sketch keeps the most common n-grams by name, with counts
+        # no lower than the exact ones, whatever the vocabulary
+        texts   = zipf_corpus(300)
+        exact   = self.macro(None)
+        sketch  = self.macro()
+        for macro in (exact, sketch):
+            macro.NGrams = { 'clean': [ 2 ] }
+            macro.load_raw(texts)
+
+        exact   = exact.Distributions['clean.2gram']
+        sketch  = sketch.Distributions['clean.2gram']
+        self.assertTrue(len(exact) > 2 * sketch.heavy.size)
+        self.assertEqual(len(sketch), sketch.heavy.size)
+        self.assertEqual(sketch.total(), exact.total())
+        for token, count in exact.most_common(10):
+            self.assertTrue(sketch.count(token) >= count)
+            self.assertTrue(sketch.count(token) <= count +
+                            exact.total() // sketch.heavy.size)
+        self.assertEqual(set(token for token, count
+                             in exact.most_common(5)),
+                         set(token for token, count
+                             in sketch.most_common(5)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# file: test_sketch.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for the count-min sketch, Space-Saving and SketchDistribution
+
+import os
+import pickle
+import random
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import zipf_corpus
+from macro_parser import MacroParser
+from sketch import CountMinSketch, SketchDistribution, SpaceSaving
+
+
+def zipf_tokens(n, seed = 0):
+    """
+    Return n tokens drawn from a Zipf-like distribution over 20000 words.
+    """
+    rand    = random.Random(seed)
+    words   = [ 'w%d' % i for i in range(20000) ]
+    weights = [ 1.0 / (i + 1) for i in range(len(words)) ]
+    total   = sum(weights)
+    cumulative, running = [ ], 0.0
+    for weight in weights:
+        running += weight / total
+        cumulative.append(running)
+
+    tokens = [ ]
+    for i in range(n):
+        x, lo, hi = rand.random(), 0, len(cumulative) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cumulative[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        tokens.append(words[lo])
+    return tokens
+
+
+class CountMinSketchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = zipf_tokens(50000)
+        self.exact  = Counter(self.tokens)
+
+    def build(self, tokens, width = 2048, depth = 4):
+        sketch = CountMinSketch(width, depth)
+        for token in tokens:
+            sketch.add(token)
+        return sketch
+
+    def test_error_bound(self):
+        width   = 2048
+        sketch  = self.build(self.tokens, width)
+        bound   = 2.0 * len(self.tokens) / width
+        over    = 0
+
+        self.assertEqual(sketch.total, len(self.tokens))
+        for token, count in self.exact.items():
+            estimate = sketch.estimate(token)
+            self.assertTrue(estimate >= count, (token, estimate, count))
+            if estimate - count > bound:
+                over += 1
+
+        # each estimate is within the bound with probability 1 - 1/2^depth
+        self.assertTrue(over <= len(self.exact) / 16.0,
+                        (over, len(self.exact)))
+        self.assertEqual(sketch.estimate('never seen'),
+                         min(row[cell] for row, cell
+                             in zip(sketch.rows,
+                                    sketch._cells('never seen'))))
+
+    def test_add_counts(self):
+        sketch = CountMinSketch(1024, 3)
+        self.assertEqual(sketch.add(u'caf\xe9', 5), 5)
+        self.assertEqual(sketch.add(u'caf\xe9'.encode('utf-8')), 6)
+        self.assertEqual(sketch.estimate(u'caf\xe9'), 6)
+        self.assertEqual(sketch.total, 6)
+
+    def test_merge(self):
+        half    = len(self.tokens) // 2
+        merged  = self.build(self.tokens[:half])
+        merged.merge(self.build(self.tokens[half:]))
+        single  = self.build(self.tokens)
+
+        self.assertEqual(merged.total, single.total)
+        self.assertEqual([ list(row) for row in merged.rows ],
+                         [ list(row) for row in single.rows ])
+        self.assertRaises(ValueError, merged.merge,
+                          CountMinSketch(1024, 4))
+
+    def test_pickle(self):
+        sketch  = self.build(self.tokens[:1000])
+        copy    = pickle.loads(pickle.dumps(sketch))
+        for token in self.tokens[:100]:
+            self.assertEqual(copy.estimate(token), sketch.estimate(token))
+
+
+class SpaceSavingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tokens = zipf_tokens(50000, seed = 1)
+        self.exact  = Counter(self.tokens)
+
+    def build(self, tokens, size = 200):
+        summary = SpaceSaving(size)
+        for token in tokens:
+            summary.add(token)
+        return summary
+
+    def check(self, summary):
+        """
+        Check the Space-Saving guarantees for summary over self.tokens.
+        """
+        n       = len(self.tokens)
+        size    = summary.size
+
+        self.assertEqual(summary.total, n)
+        self.assertTrue(len(summary.counts) <= size)
+        for token, count in self.exact.items():
+            if count > n / float(size):
+                self.assertTrue(token in summary.counts, (token, count))
+
+        for token, count in summary.items():
+            error = summary.errors[token]
+            self.assertTrue(count >= self.exact[token])
+            self.assertTrue(count - error <= self.exact[token])
+            self.assertTrue(count - self.exact[token] <= n / float(size))
+
+        self.assertTrue(summary.floor() <= n / float(size))
+
+    def test_heavy_hitters(self):
+        summary = self.build(self.tokens)
+        self.check(summary)
+
+        top     = [ token for token, count in self.exact.most_common(10) ]
+        found   = sorted(summary.items(), key = lambda item: -item[1])
+        self.assertEqual(set(token for token, count in found[:10]),
+                         set(top))
+
+    def test_not_full(self):
+        summary = SpaceSaving(10)
+        for token in 'abcabca':
+            summary.add(token)
+        self.assertEqual(dict(summary.items()), { 'a': 3, 'b': 2, 'c': 2 })
+        self.assertEqual(summary.floor(), 0)
+        self.assertEqual(summary.errors, { 'a': 0, 'b': 0, 'c': 0 })
+
+    def test_merge(self):
+        shards  = [ self.tokens[i::3] for i in range(3) ]
+        merged  = self.build(shards[0])
+        for shard in shards[1:]:
+            merged.merge(self.build(shard))
+        self.check(merged)
+
+        # merging summaries of different sizes keeps the receiver's size
+        small   = self.build(self.tokens[:1000], 50)
+        big     = self.build(self.tokens[1000:])
+        small.merge(big)
+        self.assertEqual(small.size, 50)
+        self.assertTrue(len(small.counts) <= 50)
+        self.assertEqual(small.total, len(self.tokens))
+
+
+class SketchDistributionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts  = zipf_corpus(400)
+        self.tokens = [ token for text in self.texts
+                        for token in text.lower().split(' ') ]
+        self.exact  = Counter(self.tokens)
+
+    def build(self, tokens):
+        dist = SketchDistribution(width = 4096, top = 300)
+        dist.update(tokens)
+        return dist
+
+    def test_counts(self):
+        dist = self.build(self.tokens)
+        self.assertEqual(dist.total(), len(self.tokens))
+        self.assertEqual(len(dist), 300)
+        for token, count in self.exact.items():
+            self.assertTrue(dist.count(token) >= count)
+        for token, count in dist.items():
+            self.assertTrue(count - self.exact[token] <=
+                            len(self.tokens) / 300.0)
+        self.assertEqual([ token for token, count in dist.most_common(10) ],
+                         [ token for token, count
+                           in self.exact.most_common(10) ])
+
+    def test_merge_equals_single_pass(self):
+        half    = len(self.tokens) // 2
+        single  = self.build(self.tokens)
+        merged  = self.build(self.tokens[:half])
+        merged.merge(self.build(self.tokens[half:]))
+
+        self.assertEqual(merged.total(), single.total())
+        self.assertEqual([ list(row) for row in merged.sketch.rows ],
+                         [ list(row) for row in single.sketch.rows ])
+        for token in list(self.exact)[:500]:
+            self.assertTrue(merged.count(token) >= self.exact[token])
+        self.assertEqual(
+            set(token for token, count in merged.most_common(10)),
+            set(token for token, count in single.most_common(10)))
+
+        # adding exact counts is the same as counting the tokens
+        counted = self.build(self.tokens[:half])
+        counted.add_counts(Counter(self.tokens[half:]))
+        self.assertEqual([ list(row) for row in counted.sketch.rows ],
+                         [ list(row) for row in single.sketch.rows ])
+
+    def test_macro_parser(self):
+        macro = MacroParser()
+        macro.DistributionClasses = { 'clean': SketchDistribution }
+        macro.load_raw(self.texts, workers = 2, chunksize = 50)
+        expected = MacroParser()
+        expected.load_raw(self.texts)
+
+        dist    = macro.Distributions['clean']
+        exact   = expected.Distributions['clean']
+        self.assertTrue(isinstance(dist, SketchDistribution))
+        self.assertEqual(dist.total(), exact.total())
+        self.assertEqual(macro.get_top('clean', 5), exact.most_common(5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# file: test_token_dict.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for LazyTokenDict and lazy TokenParsers
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus
+from token_dict import LazyTokenDict
+from token_parser import TokenParser
+from url_parser import UrlParser
+
+
+class LazyTokenDictTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls  = [ ]
+        self.d      = LazyTokenDict({ 'a': [ ], 'b': [ ], 'c': [ 1 ] })
+
+        def build():
+            self.calls.append('ab')
+            self.d['a'] = [ 'x' ]
+            self.d['b'] = self.d['a'] + [ 'y' ]
+
+        self.d.defer([ 'a', 'b' ], build)
+
+    def test_deferred(self):
+        d = self.d
+        self.assertEqual(sorted(d), [ 'a', 'b', 'c' ])
+        self.assertTrue('a' in d)
+        self.assertEqual(len(d), 3)
+        self.assertEqual(self.calls, [ ])
+        self.assertEqual(sorted(d.pending()), [ 'a', 'b' ])
+
+        self.assertEqual(d['b'], [ 'x', 'y' ])
+        self.assertEqual(d['a'], [ 'x' ])
+        self.assertEqual(self.calls, [ 'ab' ])
+        self.assertEqual(d.pending(), [ ])
+
+    def test_set_before_build(self):
+        self.d['a'] = [ 'set' ]
+        self.assertEqual(self.d.pending(), [ 'b' ])
+        self.assertEqual(self.d['b'], [ 'x', 'y' ])
+
+    def test_bulk_access(self):
+        expected = { 'a': [ 'x' ], 'b': [ 'x', 'y' ], 'c': [ 1 ] }
+        self.assertEqual(self.d.copy(), expected)
+        self.assertEqual(type(self.d.copy()), dict)
+        self.assertEqual(self.calls, [ 'ab' ])
+        self.assertEqual(self.d, expected)
+        self.assertEqual(dict(self.d.items()), expected)
+
+    @unittest.skipIf(bytes is str, 'python 2 copies dict subclasses directly')
+    def test_dict_copy(self):
+        self.assertEqual(dict(self.d),
+                         { 'a': [ 'x' ], 'b': [ 'x', 'y' ], 'c': [ 1 ] })
+
+
+class LazyParserTest(unittest.TestCase):
+
+    def test_copies_match_eager(self):
+        for parser_class in (TokenParser, UrlParser):
+            for text in corpus(20):
+                eager = parser_class(text).TokenDict
+                for copy in (lambda d: d.copy(), lambda d: dict(d.items())):
+                    p = parser_class(text, lazy = True)
+                    self.assertEqual(copy(p.TokenDict), eager)
+
+                if bytes is not str:
+                    p = parser_class(text, lazy = True)
+                    self.assertEqual(sorted(p.TokenDict.pending()),
+                                     sorted(eager))
+                    self.assertEqual(dict(p.TokenDict), eager)
+
+    def test_partial_then_copy(self):
+        text    = corpus(1)[0]
+        eager   = TokenParser(text).TokenDict
+        p       = TokenParser(text, lazy = True)
+        self.assertEqual(p.special(), eager['special'])
+        self.assertEqual(p.TokenDict.copy(), eager)
+
+
+if __name__ == '__main__':
+    unittest.main()
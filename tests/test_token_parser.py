@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+# file: test_token_parser.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for TokenParser
+
+import os
+import random
+import re
+import sys
+import unicodedata
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus, zipf_corpus
+from token_parser import TokenParser
+
+
+class KeyParser(TokenParser):
+    """
+    Adds a key filled by _post_hooks, which lazy mode defers to the end.
+    """
+
+    def _init_hooks(self):
+        self.TokenDict['upper'] = [ ]
+
+    def _post_hooks(self):
+        self.TokenDict['upper'] = [ token for token in self.TokenDict['clean']
+                                    if self._is_word(token.upper()) ]
+
+
+def quadratic_replace_punctuation(parser, tokens):
+    """
+    The original _replace_punctuation, which rebuilt the token list for
+    every token it split, kept to check the single-pass version against.
+    """
+    _tokens = list(tokens)
+    r       = len(_tokens)
+    i       = 0
+
+    while i < r:
+        ignore = False
+        for f in parser.config.preserve_token:
+            if parser._resolve_parser(f)(_tokens[i]): ignore = True
+
+        match = re.search(parser.regex['punc'], _tokens[i], re.U)
+        if not ignore and match:
+            p           = match.group(2)
+            _tokens[i]  = re.sub(parser.regex['punc'], '\\1 \\3',
+                                 _tokens[i], re.U)
+            insert = _tokens[i].split()
+
+            if not re.match(parser.regex['strip'], p, re.U):
+                insert.insert(1, p)
+
+            i += 1
+            r += len(insert) - 1
+            _tokens = _tokens[:i - 1] + insert + _tokens[i:]
+
+        i += 1
+
+    return [ token for token in _tokens if not token == '' ]
+
+
+PUNCTUATED  = [ 'wow!!', 'end.', 'really?!', 'hello...', '...', '!', '',
+                'a,b,c', 'a!b!c!d', "don't!", '(maybe)', '((x))', 'x.',
+                '.x', 'a@b', '#tag!', '@user,', '$AAPL.', ':)', ':-(!',
+                'http://example.com/a.', 'a.' * 40, '!?' * 20, u'caf\xe9!',
+                u'\u2014dash\u2014', 'a  b', 'x!y z?' ]
+
+
+class PunctuationTest(unittest.TestCase):
+
+    def sentences(self):
+        rand    = random.Random(0)
+        yield PUNCTUATED
+        for i in range(300):
+            yield [ rand.choice(PUNCTUATED)
+                    for j in range(rand.randint(0, 8)) ]
+        for text in corpus(100) + zipf_corpus(100):
+            yield text.split(' ')
+
+    def test_matches_quadratic_version(self):
+        for size in (0, 1000):
+            TokenParser.token_cache_size = size
+            try:
+                p = TokenParser('')
+                for tokens in self.sentences():
+                    self.assertEqual(p._replace_punctuation(tokens),
+                                     quadratic_replace_punctuation(p, tokens),
+                                     tokens)
+            finally:
+                TokenParser.token_cache_size = 0
+
+    def test_sentence(self):
+        for tokens in self.sentences():
+            p = TokenParser(list(tokens))
+            self.assertEqual(p.sent(),
+                             quadratic_replace_punctuation(p, tokens))
+
+    def test_iterable(self):
+        p = TokenParser('')
+        self.assertEqual(p._replace_punctuation(iter(PUNCTUATED)),
+                         quadratic_replace_punctuation(p, PUNCTUATED))
+
+
+class TagReleaseTest(unittest.TestCase):
+
+    def test_eager(self):
+        for parser_class in (TokenParser, KeyParser):
+            self.assertEqual(parser_class(corpus(1)[0])._tags, None)
+
+    def test_lazy(self):
+        for parser_class in (TokenParser, KeyParser):
+            p = parser_class(corpus(1)[0], lazy = True)
+            p.special()
+            self.assertNotEqual(p._tags, None)
+            for key in list(p.TokenDict):
+                p.TokenDict[key]
+            self.assertEqual(p.TokenDict.pending(), [ ])
+            self.assertEqual(p._tags, None)
+
+            p = parser_class(corpus(1)[0], lazy = True)
+            p.TokenDict.materialize()
+            self.assertEqual(p._tags, None)
+            self.assertEqual(dict(p.TokenDict.items()),
+                             parser_class(corpus(1)[0]).TokenDict)
+
+    def test_batch(self):
+        for lazy in (False, True):
+            TokenParser.lazy = lazy
+            try:
+                parsers = list(TokenParser.parse_many(corpus(5)))
+            finally:
+                TokenParser.lazy = False
+            for p in parsers:
+                p.TokenDict.copy()
+                self.assertEqual(p._tags, None)
+
+
+def clean_parser(**options):
+    """
+    Return a TokenParser class with the given clean_* options set.
+    """
+    class CleanParser(TokenParser):
+
+        def _init_config(self):
+            TokenParser._init_config(self)
+            for name, value in options.items():
+                setattr(self.config, name, value)
+
+    return CleanParser
+
+
+CLEAN_TEXT  = u'Cafe\u0301 ! the Stra\xdfe \uff21\uff22\uff23 is THE place.'
+
+
+class CleanOptionsTest(unittest.TestCase):
+
+    def clean(self, **options):
+        return clean_parser(**options)(CLEAN_TEXT).clean()
+
+    def test_default(self):
+        # without normalization the combining accent is split off as
+        # punctuation and the word loses it
+        self.assertEqual(self.clean(),
+                         [ u'cafe', u'the', u'stra\xdfe',
+                           u'\uff41\uff42\uff43', u'is', u'the', u'place' ])
+
+    def test_normalize(self):
+        p = clean_parser(clean_normalize = 'NFC')(CLEAN_TEXT)
+        self.assertEqual(p.sent()[:2], [ u'Caf\xe9', u'!' ])
+        self.assertEqual(p.clean(),
+                         [ u'caf\xe9', u'the', u'stra\xdfe',
+                           u'\uff41\uff42\uff43', u'is', u'the', u'place' ])
+        self.assertEqual(self.clean(clean_normalize = 'NFKC')[3], u'abc')
+
+    def test_normalize_word_test(self):
+        # a token that is only a word once composed is kept
+        text = u'e\u0301 \u0301'
+        self.assertEqual(TokenParser(text).clean(), [ u'e' ])
+        self.assertEqual(clean_parser(clean_normalize = 'NFC')(text).clean(),
+                         [ u'\xe9' ])
+
+    def test_normalize_special(self):
+        text    = u'http://x.co/caf\xe9 http://x.co/cafe\u0301 ok'
+        p       = clean_parser(clean_normalize = 'NFC')(text)
+        self.assertEqual(p.special(), text.split()[:2])
+        self.assertEqual(p.sent(),
+                         [ u'http://x.co/caf\xe9' ] * 2 + [ u'ok' ])
+        self.assertEqual(p.clean(), [ u'ok' ])
+
+    @unittest.skipIf(bytes is str, 'casefold is python 3 only')
+    def test_casefold(self):
+        self.assertEqual(self.clean(clean_casefold = True)[2], u'strasse')
+
+    def test_stopwords(self):
+        expected = [ u'cafe', u'stra\xdfe', u'\uff41\uff42\uff43', u'place' ]
+        for stopwords in ([ 'the', 'is' ], set([ 'the', 'is' ]),
+                          (word for word in ('the', 'is'))):
+            p = clean_parser(clean_stopwords = stopwords)(CLEAN_TEXT)
+            self.assertEqual(p.clean(), expected)
+            self.assertTrue(isinstance(p.config.clean_stopwords,
+                                       (set, frozenset)))
+
+        # stopwords are compared to the cleaned form
+        self.assertEqual(self.clean(clean_stopwords = [ 'THE' ]).count('the'),
+                         2)
+
+    def test_combined(self):
+        options = { 'clean_normalize': 'NFKC', 'clean_stopwords': [ 'abc' ] }
+        if bytes is not str:
+            options['clean_casefold'] = True
+            options['clean_stopwords'].append(u'strasse')
+        self.assertEqual(self.clean(**options)[:3],
+                         [ u'caf\xe9', u'the', u'is' ]
+                         if bytes is not str else
+                         [ u'caf\xe9', u'the', u'stra\xdfe' ])
+
+    def test_modes_match_eager(self):
+        texts = [ CLEAN_TEXT, u'e\u0301 \u0301' ] + corpus(20)
+        for options in ({ }, { 'clean_normalize': 'NFC' },
+                        { 'clean_normalize': 'NFKD' },
+                        { 'clean_stopwords': [ 'the', 'a' ] },
+                        { 'clean_casefold': True }):
+            parser_class = clean_parser(**options)
+            for text in texts:
+                eager = parser_class(text).TokenDict
+                self.assertEqual(
+                    dict(parser_class(text, lazy = True).TokenDict.items()),
+                    eager)
+                parser_class.span_mode = True
+                try:
+                    p = parser_class(text)
+                finally:
+                    parser_class.span_mode = False
+                for key in eager:
+                    self.assertEqual(list(p.TokenDict[key]), eager[key])
+                if options.get('clean_normalize'):
+                    self.assertEqual(p.spans('clean'), None)
+                    self.assertEqual(
+                        p.sent(),
+                        [ token if isinstance(token, bytes)
+                          else unicodedata.normalize(
+                                    options['clean_normalize'], token)
+                          for token in p.sent() ])
+
+
+if __name__ == '__main__':
+    unittest.main()
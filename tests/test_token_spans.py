@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# file: test_token_spans.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for TokenSpans and TokenParser's span mode
+
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus, zipf_corpus
+from token_parser import TokenParser
+from token_spans import TokenSpans
+from tokenizer import Tokenizer
+
+
+TEXT = (u'Wow!! see http://Example.com/a. and (maybe) a,b,c\tthen '
+        u'mail Bob@Example.com :) $AAPL. is UP!?\n caf\xe9! —dash— '
+        u'na\xefve... #tag! @user, x.  ')
+
+KEYS = [ 'tokens', 'special', 'sent', 'clean' ]
+
+missing = object()
+
+
+class SentParser(TokenParser):
+    """
+    Has a second sentence parser, so sent and clean are stored as lists.
+    """
+
+    def _init_config(self):
+        TokenParser._init_config(self)
+        self.config.do_sparsers.append('self._drop_x')
+
+    def _drop_x(self, tokens):
+        return [ token for token in tokens if token != 'x' ]
+
+
+def span_parse(parser_class, text, **attributes):
+    """
+    Parse text with parser_class in span mode, setting attributes on the
+    class for the parse.
+    """
+    attributes['span_mode'] = True
+    saved = dict((name, parser_class.__dict__.get(name, missing))
+                 for name in attributes)
+    for name, value in attributes.items():
+        setattr(parser_class, name, value)
+    try:
+        return parser_class(text)
+    finally:
+        for name, value in saved.items():
+            if value is missing:
+                delattr(parser_class, name)
+            else:
+                setattr(parser_class, name, value)
+
+
+class TokenSpansTest(unittest.TestCase):
+
+    def test_sequence(self):
+        source  = u'Hello big World'
+        spans   = TokenSpans(source, form = lambda token: token.lower())
+        for start, end in ((0, 5), (10, 15)):
+            spans.add(start, end)
+
+        self.assertEqual(len(spans), 2)
+        self.assertEqual(list(spans), [ u'hello', u'world' ])
+        self.assertEqual(spans[1], u'world')
+        self.assertEqual(spans[-1:], [ u'world' ])
+        self.assertEqual(spans.spans(), [ (0, 5), (10, 15) ])
+        self.assertEqual(spans, [ u'hello', u'world' ])
+        self.assertEqual(spans, (u'hello', u'world'))
+        self.assertNotEqual(spans, [ u'hello' ])
+        self.assertFalse(spans == u'hello world')
+
+    def test_bytes(self):
+        source  = u'caf\xe9 ok'.encode('utf-8')
+        spans   = TokenSpans(source, 'utf-8')
+        spans.add(0, 5)
+        spans.add(6, 8)
+        self.assertEqual(list(spans), [ u'caf\xe9', u'ok' ])
+
+
+class SpanModeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir    = tempfile.mkdtemp()
+        self.texts  = [ TEXT, u'', u'   ', u'!' ] + corpus(30) + \
+                      zipf_corpus(30)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def native(self, text):
+        """
+        Return the form byte input is parsed as: text under python 3,
+        and utf-8 bytes under python 2.
+        """
+        if bytes is str and isinstance(text, type(u'')):
+            return text.encode('utf-8')
+        return text
+
+    def check(self, p, source, expected, encoding = None):
+        """
+        Check that p's TokenDict matches the eager TokenDict, and that the
+        offsets of each key point at its tokens in source.
+        """
+        for key in KEYS:
+            self.assertEqual(p.TokenDict[key], expected[key], key)
+            self.assertEqual(list(p.TokenDict[key]), expected[key], key)
+            self.assertEqual(p._strings(key), expected[key], key)
+
+            spans = p.spans(key)
+            self.assertEqual(len(spans), len(expected[key]), key)
+            for (start, end), token in zip(spans, expected[key]):
+                found = source[start:end]
+                if encoding is not None:
+                    found = found.decode(encoding)
+                if key == 'clean':
+                    found = found.lower()
+                self.assertEqual(found, token, key)
+
+        self.assertEqual(p.sent(), expected['sent'])
+        self.assertEqual(p.clean(), expected['clean'])
+        self.assertEqual(p.special(), expected['special'])
+
+    def test_text(self):
+        for text in self.texts:
+            text        = self.native(text)
+            expected    = TokenParser(text.split()).TokenDict
+            self.check(span_parse(TokenParser, text), text, expected)
+
+        p = span_parse(TokenParser, TEXT)
+        self.assertEqual(p.spans('tokens')[:3],
+                         [ (0, 5), (6, 9), (10, 31) ])
+        self.assertEqual(p.spans('sent')[0], (0, 3))
+        self.assertEqual(sorted(p.spans('special')),
+                         sorted((TEXT.index(token),
+                                 TEXT.index(token) + len(token))
+                                for token in (u'http://Example.com/a.',
+                                              u'Bob@Example.com', u':)')))
+
+    def test_bytes(self):
+        for text in self.texts:
+            data        = text.encode('utf-8')
+            expected    = TokenParser(self.native(text).split()).TokenDict
+            encoding    = None if bytes is str else 'utf-8'
+            self.check(span_parse(TokenParser, data), data, expected,
+                       encoding)
+            if encoding is not None:
+                latin   = Tokenizer(encoding = 'latin-1')
+                decoded = data.decode('latin-1').split()
+                self.check(span_parse(TokenParser, data, tokenizer = latin),
+                           data, TokenParser(decoded).TokenDict, 'latin-1')
+
+        # offsets count bytes
+        if bytes is not str:
+            p       = span_parse(TokenParser, TEXT.encode('utf-8'))
+            start   = len(TEXT[:TEXT.index(u'caf\xe9')].encode('utf-8'))
+            self.assertTrue((start, start + 5) in p.spans('sent'))
+            self.assertTrue((start, start + 5) in p.spans('clean'))
+
+    def test_mmap(self):
+        path = os.path.join(self.dir, 'text')
+        for text in (TEXT, corpus(1)[0], u''):
+            with open(path, 'wb') as f:
+                f.write(text.encode('utf-8') or b' ')
+
+            expected = TokenParser(self.native(text).split()).TokenDict
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+                try:
+                    p = span_parse(TokenParser, buffer)
+                    self.check(p, buffer, expected,
+                               None if bytes is str else 'utf-8')
+                    self.assertTrue(p.TokenDict['tokens'].source is buffer)
+                finally:
+                    buffer.close()
+
+    @unittest.skipIf(bytes is str, 'python 2 scans bytes as text')
+    def test_bytes_need_encoding(self):
+        self.assertRaises(TypeError, span_parse, TokenParser,
+                          TEXT.encode('utf-8'), tokenizer = Tokenizer())
+
+    def test_stored_as_spans(self):
+        p = span_parse(TokenParser, TEXT)
+        for key in KEYS:
+            self.assertTrue(isinstance(p.TokenDict[key], TokenSpans), key)
+
+        # lazy is ignored, and token lists are parsed as usual
+        p = span_parse(TokenParser, TEXT, lazy = True)
+        self.assertEqual(dict(p.TokenDict),
+                         TokenParser(TEXT.split()).TokenDict)
+        p = span_parse(TokenParser, TEXT.split())
+        self.assertEqual(p.spans('tokens'), None)
+
+    def test_other_sentence_parsers(self):
+        for text in self.texts:
+            text        = self.native(text)
+            expected    = SentParser(text.split()).TokenDict
+            p           = span_parse(SentParser, text)
+            for key in KEYS:
+                self.assertEqual(p._strings(key), expected[key], key)
+            self.assertEqual(p.spans('sent'), None)
+            self.assertEqual(p.spans('clean'), None)
+            self.assertEqual(len(p.spans('tokens')), len(expected['tokens']))
+
+
+if __name__ == '__main__':
+    unittest.main()
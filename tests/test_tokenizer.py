@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# file: test_tokenizer.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for Tokenizer and TokenParser's tokenizer input
+
+import mmap
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus
+from classifier import Classifier
+from token_parser import TokenParser
+from tokenizer import Tokenizer
+
+
+TEXT = (u'see  http://example.com/a, then\tmail bob@example.com :)\n'
+        u'$AAPL is up! caf\xe9 — na\xefve\r\n\n  #tag @user ')
+
+# the TokenParser predicate for each class the tokenizer tags with
+PREDICATES  = { 'url': '_is_url', 'email': '_is_email',
+                'ticker': '_is_stock', 'emoticon': '_is_emoticon',
+                'word': '_is_word' }
+
+
+def classifier():
+    return Classifier(TokenParser.regex, TokenParser.regex_flags,
+                      TokenParser.regex_rewrite)
+
+
+class ScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def check_offsets(self, buffer, scanned, decode = None):
+        for token, start, end in scanned:
+            text = buffer[start:end]
+            if decode is not None:
+                text = text.decode(decode)
+            self.assertEqual(text, token)
+
+    def test_text(self):
+        scanned = list(Tokenizer().scan(TEXT))
+        self.assertEqual([ token for token, start, end in scanned ],
+                         TEXT.split())
+        self.check_offsets(TEXT, scanned)
+        self.assertEqual(scanned[0], (u'see', 0, 3))
+        self.assertEqual(scanned[1], (u'http://example.com/a,', 5, 26))
+        self.assertEqual(Tokenizer().tokens(TEXT), TEXT.split())
+        self.assertEqual(Tokenizer().tokens(u'  \t\n'), [ ])
+
+    def test_start_end(self):
+        tokenizer   = Tokenizer()
+        start       = TEXT.index(u'then')
+        end         = TEXT.index(u'$AAPL') + 3
+        scanned     = list(tokenizer.scan(TEXT, start, end))
+        self.assertEqual([ token for token, s, e in scanned ],
+                         TEXT[start:end].split())
+        self.check_offsets(TEXT, scanned)
+        self.assertEqual(scanned[-1][1:], (end - 3, end))
+
+    def test_bytes(self):
+        data    = TEXT.encode('utf-8')
+        scanned = list(Tokenizer(encoding = 'utf-8').scan(data))
+        self.assertEqual([ token for token, start, end in scanned ],
+                         TEXT.split())
+        self.check_offsets(data, scanned, 'utf-8')
+
+        # offsets count bytes, not characters
+        start = TEXT.index(u'caf\xe9')
+        self.assertEqual(scanned[-5], (u'caf\xe9', start, start + 5))
+        self.assertEqual(scanned[-3][1:], (start + 10, start + 16))
+        self.assertEqual(Tokenizer(encoding = 'utf-8').tokens(data),
+                         TEXT.split())
+
+        # without an encoding the tokens are left as bytes
+        self.assertEqual(Tokenizer().tokens(data), data.split())
+
+    def test_mmap(self):
+        path = os.path.join(self.dir, 'text')
+        with open(path, 'wb') as f:
+            f.write(TEXT.encode('utf-8'))
+
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                tokenizer   = Tokenizer(encoding = 'utf-8')
+                scanned     = list(tokenizer.scan(buffer))
+                self.assertEqual([ token for token, start, end in scanned ],
+                                 TEXT.split())
+                self.check_offsets(buffer, scanned, 'utf-8')
+                self.assertEqual(tokenizer.tokens(buffer), TEXT.split())
+            finally:
+                buffer.close()
+
+
+class TagTest(unittest.TestCase):
+
+    def test_tags_match_regexes(self):
+        classes = classifier().classes
+        for text in [ TEXT ] + corpus(50):
+            for token, start, end, tags in Tokenizer(classifier()).tag(text):
+                for name in classes:
+                    flags = re.U | TokenParser.regex_flags.get(name, 0)
+                    match = re.match(TokenParser.regex[name], token, flags)
+                    self.assertEqual(name in tags, match is not None,
+                                     (token, name))
+
+    def test_tags_match_predicates(self):
+        for text in [ TEXT ] + corpus(50):
+            p = TokenParser(text)
+            for token, start, end, tags in Tokenizer(classifier()).tag(text):
+                for name, predicate in PREDICATES.items():
+                    self.assertEqual(name in tags,
+                                     getattr(p, predicate)(token),
+                                     (token, name))
+
+    def test_classified_once(self):
+        seen    = [ ]
+        text    = u'a b a c b a'
+
+        def classify(token):
+            seen.append(token)
+            return frozenset([ len(seen) ])
+
+        tagged = list(Tokenizer().tag(text, classify = classify))
+        self.assertEqual(seen, [ u'a', u'b', u'c' ])
+        self.assertEqual([ (token, start, list(tags)[0])
+                           for token, start, end, tags in tagged ],
+                         [ (u'a', 0, 1), (u'b', 2, 2), (u'a', 4, 1),
+                           (u'c', 6, 3), (u'b', 8, 2), (u'a', 10, 1) ])
+
+    def test_tag_bytes(self):
+        data    = TEXT.encode('utf-8')
+        text    = list(Tokenizer(classifier()).tag(TEXT))
+        tagged  = list(Tokenizer(classifier(), 'utf-8').tag(data))
+        self.assertEqual([ (token, tags) for token, start, end, tags
+                           in tagged ],
+                         [ (token, tags) for token, start, end, tags
+                           in text ])
+
+
+class TokenizerParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def parse(self, text, tokenizer = None):
+        TokenParser.tokenizer = tokenizer
+        try:
+            return TokenParser(text).TokenDict
+        finally:
+            TokenParser.tokenizer = None
+
+    def test_matches_split(self):
+        # with a tokenizer, parsing text is the same as parsing its tokens
+        for text in [ TEXT ] + corpus(50):
+            self.assertEqual(self.parse(text, Tokenizer()),
+                             TokenParser(text.split()).TokenDict)
+
+    def test_buffers(self):
+        path = os.path.join(self.dir, 'text')
+        with open(path, 'wb') as f:
+            f.write(TEXT.encode('utf-8'))
+
+        expected = TokenParser(TEXT.split()).TokenDict
+        with open(path, 'rb') as f:
+            buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            try:
+                tokenizer = Tokenizer(encoding = 'utf-8')
+                for data in (TEXT.encode('utf-8'), buffer):
+                    self.assertEqual(self.parse(data, tokenizer), expected)
+            finally:
+                buffer.close()
+
+    @unittest.skipIf(bytes is str, 'python 2 scans bytes as text')
+    def test_bytes_need_encoding(self):
+        data = TEXT.encode('utf-8')
+        self.assertRaises(TypeError, self.parse, data, Tokenizer())
+
+        # the default scanner for bytes decodes them as utf-8
+        scanner = TokenParser('')._scanner(data)
+        self.assertEqual(scanner.tokens(data), TEXT.split())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+# file: test_url_parser.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for UrlParser, its title resolvers and UrlMacroParser
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from token_parser import TokenParser
+from url_parser import (TitleCache, UrlMacroParser, UrlParser, domains,
+                        fetch_title, split_url)
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:                         # python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+
+TEXT = ('see http://www.Example.com/a/ and https://news.example.com/b?x=1 '
+        'and http://x.co, http://example.com/a#top')
+
+
+class StubResolver():
+    """
+    Resolves titles from a dictionary, counting the lookups.
+    """
+
+    def __init__(self, titles):
+        self.titles = titles
+        self.calls  = [ ]
+
+    def __call__(self, url):
+        self.calls.append(url)
+        return self.titles.get(url)
+
+
+class SplitUrlTest(unittest.TestCase):
+
+    def test_split_url(self):
+        cases = [
+            ('http://x.co',                     ('http', 'x.co', '/')),
+            ('HTTPS://User@WWW.Example.COM.:8080/News/?q=1#top',
+                                                ('https', 'example.com',
+                                                 '/News')),
+            ('(http://example.com/a/b/).',      ('http', 'example.com',
+                                                 '/a/b')),
+            ('example.org/path/to/',            ('http', 'example.org',
+                                                 '/path/to')),
+            ('http://www.x.co#frag',            ('http', 'x.co', '/')),
+        ]
+        for url, expected in cases:
+            self.assertEqual(split_url(url), expected)
+
+    def test_hosts_are_interned(self):
+        first   = split_url('http://' + 'shared' + '.example.com/a')[1]
+        second  = split_url('http://SHARED.example.com/b')[1]
+        self.assertTrue(first is second)
+
+    def test_domains(self):
+        self.assertEqual(domains('a.news.example.com'),
+                         [ 'a.news.example.com', 'news.example.com',
+                           'example.com' ])
+        self.assertEqual(domains('example.com'), [ 'example.com' ])
+        self.assertEqual(domains('localhost'), [ 'localhost' ])
+        self.assertEqual(domains('10.0.0.1'), [ '10.0.0.1' ])
+
+
+class UrlParserTest(unittest.TestCase):
+
+    def tearDown(self):
+        UrlParser.title_resolver = None
+
+    def test_sites_and_urls(self):
+        p = UrlParser(TEXT)
+        self.assertEqual(p.sites(), [ 'example.com', 'news.example.com',
+                                      'x.co', 'example.com' ])
+        self.assertEqual(p.urls(), [ 'example.com/a', 'news.example.com/b',
+                                     'x.co', 'example.com/a' ])
+        self.assertTrue(p.urls()[0] is p.urls()[3])
+        self.assertEqual(p.titles(), [ ])
+
+    def test_lazy_and_batch(self):
+        expected = UrlParser(TEXT).TokenDict
+        for p in (UrlParser(TEXT, lazy = True),
+                  list(UrlParser.parse_many([ TEXT ]))[0]):
+            for key in ('sites', 'urls', 'titles'):
+                self.assertEqual(p.TokenDict[key], expected[key])
+
+    def test_title_resolver(self):
+        stub = StubResolver({ 'http://example.com/a': 'Example A' })
+        UrlParser.title_resolver = stub
+        self.assertEqual(UrlParser(TEXT).titles(),
+                         [ 'Example A', 'Example A' ])
+        self.assertEqual(len(stub.calls), 4)
+
+    def test_plain_function_resolver(self):
+        UrlParser.title_resolver = lambda url: url.upper()
+        self.assertEqual(UrlParser('http://x.co').titles(),
+                         [ 'HTTP://X.CO/' ])
+
+    def test_regex_not_shared(self):
+        before = dict(TokenParser.regex)
+        UrlParser(TEXT)
+        self.assertEqual(TokenParser.regex, before)
+
+
+class TitleCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir    = tempfile.mkdtemp()
+        self.path   = os.path.join(self.dir, 'titles.json')
+        self.stub   = StubResolver({ 'http://a.com/': u'Caf\xe9 A' })
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_hit_and_miss(self):
+        cache = TitleCache(self.path, self.stub)
+        self.assertEqual(cache('http://a.com/'), u'Caf\xe9 A')
+        self.assertEqual(cache('http://a.com/'), u'Caf\xe9 A')
+        self.assertEqual(self.stub.calls, [ 'http://a.com/' ])
+
+    def test_failures_are_cached(self):
+        cache = TitleCache(self.path, self.stub)
+        self.assertEqual(cache('http://b.com/'), None)
+        self.assertEqual(cache('http://b.com/'), None)
+        self.assertEqual(self.stub.calls, [ 'http://b.com/' ])
+
+    def test_persistence(self):
+        cache = TitleCache(self.path, self.stub)
+        cache('http://a.com/')
+        cache('http://b.com/')
+
+        stub    = StubResolver({ })
+        cache   = TitleCache(self.path, stub)
+        self.assertEqual(cache('http://a.com/'), u'Caf\xe9 A')
+        self.assertEqual(cache('http://b.com/'), None)
+        self.assertEqual(stub.calls, [ ])
+
+    def test_truncated_line(self):
+        TitleCache(self.path, self.stub)('http://a.com/')
+        with io.open(self.path, 'a', encoding = 'utf-8') as f:
+            f.write(u'{"url": "http://c.com/", "ti')
+
+        stub    = StubResolver({ 'http://c.com/': 'C' })
+        cache   = TitleCache(self.path, stub)
+        self.assertEqual(cache('http://a.com/'), u'Caf\xe9 A')
+        self.assertEqual(cache('http://c.com/'), 'C')
+        self.assertEqual(stub.calls, [ 'http://c.com/' ])
+
+    def test_with_parser(self):
+        UrlParser.title_resolver = TitleCache(self.path, self.stub)
+        try:
+            p = UrlParser('http://a.com http://A.com/ http://b.com')
+        finally:
+            UrlParser.title_resolver = None
+        self.assertEqual(p.titles(), [ u'Caf\xe9 A', u'Caf\xe9 A' ])
+        self.assertEqual(len(self.stub.calls), 2)
+
+
+class PageHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+        if self.path == '/titled':
+            self.wfile.write(u'<html><head><TITLE>\n Caf\xe9 &amp; co '
+                             u'</TITLE></head></html>'.encode('utf-8'))
+        else:
+            self.wfile.write(b'<html>no title</html>')
+
+    def log_message(self, *args):
+        pass
+
+
+class FetchTitleTest(unittest.TestCase):
+    """
+    fetch_title against a server on the loopback interface.
+    """
+
+    def setUp(self):
+        self.server = HTTPServer(('127.0.0.1', 0), PageHandler)
+        self.url    = 'http://127.0.0.1:%d' % self.server.server_address[1]
+        self.thread = threading.Thread(target = self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_fetch_title(self):
+        self.assertEqual(fetch_title(self.url + '/titled'), u'Caf\xe9 & co')
+        self.assertEqual(fetch_title(self.url + '/untitled'), None)
+
+    def test_unreachable(self):
+        self.assertEqual(fetch_title('http://127.0.0.1:1/'), None)
+        self.assertEqual(fetch_title('not a url'), None)
+
+
+class UrlMacroParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.macro = UrlMacroParser()
+        self.macro.load_raw([ TEXT, 'nothing here',
+                              'go to https://b.example.com/',
+                              'http://other.org/x' ])
+
+    def test_get_site(self):
+        macro = self.macro
+        self.assertEqual([ macro.Parsers.index(p)
+                           for p in macro.get_site('example.com') ], [ 0, 2 ])
+        self.assertEqual(macro.get_site('news.example.com'),
+                         [ macro.Parsers[0] ])
+        self.assertEqual(macro.get_site('WWW.Other.org'),
+                         [ macro.Parsers[3] ])
+        self.assertEqual(macro.get_site('nowhere.com'), [ ])
+
+    def test_counts_sites(self):
+        self.assertEqual(self.macro.get_count('sites', 'example.com'), 2)
+        self.assertEqual(self.macro.get_count('urls', 'example.com/a'), 2)
+
+    def test_reimport(self):
+        self.macro.import_parser(self.macro.Parsers[0])
+        self.assertEqual(len(self.macro.get_site('example.com')), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
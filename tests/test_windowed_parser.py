@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# file: test_windowed_parser.py
+# author: kyle isom <coder@kyleisom.net>
+# license: ISC / public domain dual-license
+#
+# tests for WindowedMacroParser
+
+import os
+import random
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, 'parser'))
+
+from benchmark import corpus
+from token_parser import TokenParser
+from windowed_parser import WindowedMacroParser
+
+
+KEYS = [ 'clean', 'special' ]
+
+
+def windowed(tumbling = False, bucket = 10, buckets = 3):
+    macro               = WindowedMacroParser()
+    macro.BucketSeconds = bucket
+    macro.WindowBuckets = buckets
+    macro.Tumbling      = tumbling
+    macro.CountKeys     = KEYS
+    return macro
+
+
+class BruteForce():
+    """
+    Recounts the texts in the window from scratch: a text is counted if
+    its bucket is still in the window when it arrives, and is in the
+    window at time now if its bucket is at or after the window's first.
+    """
+
+    def __init__(self, bucket, buckets, tumbling):
+        self.bucket     = bucket
+        self.buckets    = buckets
+        self.tumbling   = tumbling
+        self.now        = None
+        self.texts      = [ ]           # (bucket index, TokenDict)
+        self.late       = 0
+
+    def first(self, now):
+        index = int(now // self.bucket)
+        if self.tumbling:
+            return index - index % self.buckets
+        return index - self.buckets + 1
+
+    def add(self, timestamp, text):
+        if self.now is None or timestamp > self.now:
+            self.now = timestamp
+        index = int(timestamp // self.bucket)
+        if index < self.first(self.now):
+            self.late += 1
+            return
+        self.texts.append((index, TokenParser(text).TokenDict))
+
+    def counts(self, key, now = None):
+        if now is not None and now > self.now:
+            self.now = now
+        first = self.first(self.now)
+        return dict(Counter(token for index, tokens in self.texts
+                            if index >= first for token in tokens[key]))
+
+
+class WindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.texts = corpus(200)
+
+    def check(self, macro, brute, now = None):
+        for key in KEYS:
+            expected = brute.counts(key, now)
+            if now is not None:
+                macro.advance(now)
+            dist = macro.Distributions.get(key)
+            self.assertEqual(dict(dist.items()) if dist else { }, expected,
+                             (key, macro.now))
+            for token, count in list(expected.items())[:5]:
+                self.assertEqual(macro.get_count(key, token), count)
+        self.assertEqual(macro.late, brute.late)
+
+    def run_stream(self, tumbling, stamps):
+        macro = windowed(tumbling)
+        brute = BruteForce(10, 3, tumbling)
+        for timestamp, text in zip(stamps, self.texts):
+            macro.import_raw(text, timestamp)
+            brute.add(timestamp, text)
+            self.check(macro, brute)
+            self.assertTrue(len(macro._buckets) <= 3)
+        return macro, brute
+
+    def stamps(self, seed, jitter):
+        rand    = random.Random(seed)
+        clock   = 1000.0
+        stamps  = [ ]
+        for text in self.texts:
+            clock += rand.expovariate(0.5)
+            stamps.append(clock - rand.uniform(0, jitter))
+        return stamps
+
+    def test_sliding(self):
+        for seed in range(3):
+            macro, brute = self.run_stream(False, self.stamps(seed, 0))
+            self.assertEqual(macro.late, 0)
+            for later in (5, 10, 20, 30, 31):
+                self.check(macro, brute, brute.now + later)
+            self.assertEqual(macro.Distributions['clean'].total(), 0)
+
+    def test_tumbling(self):
+        for seed in range(3):
+            macro, brute = self.run_stream(True, self.stamps(seed, 0))
+            for later in (5, 10, 20, 30):
+                self.check(macro, brute, brute.now + later)
+
+    def test_out_of_order(self):
+        for tumbling in (False, True):
+            macro, brute = self.run_stream(tumbling, self.stamps(7, 40))
+            self.assertTrue(macro.late > 0)
+            self.assertTrue(macro.late < len(self.texts))
+
+    def test_load_timed(self):
+        stamps  = self.stamps(1, 15)
+        macro   = windowed()
+        macro.load_timed(zip(stamps, self.texts))
+        brute   = BruteForce(10, 3, False)
+        for timestamp, text in zip(stamps, self.texts):
+            brute.add(timestamp, text)
+        self.check(macro, brute)
+        self.assertEqual(macro.get_parsers(), [ ])
+
+
+class BoundaryTest(unittest.TestCase):
+
+    def test_sliding_boundaries(self):
+        macro = windowed()
+        for timestamp, text in ((0, 'a'), (9.999, 'b'), (10, 'c'),
+                                (29.999, 'd')):
+            macro.import_raw(text, timestamp)
+        self.assertEqual(macro.window(), (0, 30))
+        self.assertEqual(sorted(dict(macro.Distributions['clean'].items())),
+                         [ 'a', 'b', 'c', 'd' ])
+
+        # the first bucket leaves the window as the clock reaches 30
+        self.assertEqual(macro.get_count('clean', 'a', now = 29.9999), 1)
+        self.assertEqual(macro.get_count('clean', 'a', now = 30), 0)
+        self.assertEqual(macro.get_count('clean', 'b'), 0)
+        self.assertEqual(macro.window(), (10, 40))
+        self.assertEqual(sorted(macro._buckets), [ 1, 2 ])
+        self.assertFalse('a' in dict(macro.Distributions['clean'].items()))
+
+        self.assertEqual(macro.get_top('clean', 5, now = 49.9),
+                         [ ('d', 1) ])
+        self.assertEqual(macro.get_top('clean', 5, now = 50), [ ])
+        self.assertEqual(macro._buckets, { })
+
+    def test_tumbling_boundaries(self):
+        macro = windowed(tumbling = True)
+        for timestamp, text in ((0, 'a'), (15, 'b'), (29.999, 'c')):
+            macro.import_raw(text, timestamp)
+        self.assertEqual(macro.window(), (0, 30))
+        self.assertEqual(macro.get_count('clean', 'a'), 1)
+
+        # the whole block is emptied when the next one starts
+        macro.import_raw('d', 30)
+        self.assertEqual(macro.window(), (30, 40))
+        self.assertEqual(dict(macro.Distributions['clean'].items()),
+                         { 'd': 1 })
+
+        # a text from the last block is late, one from this block is not
+        macro.import_raw('e', 29)
+        macro.import_raw('f', 31)
+        self.assertEqual(macro.late, 1)
+        self.assertEqual(dict(macro.Distributions['clean'].items()),
+                         { 'd': 1, 'f': 1 })
+        self.assertEqual(macro.get_top('clean', now = 59.99),
+                         [ ('d', 1), ('f', 1) ])
+        self.assertEqual(macro.get_top('clean', now = 60), [ ])
+
+    def test_clock(self):
+        macro = windowed()
+        self.assertEqual(macro.window(), None)
+        macro.import_raw('a b a', 100)
+        macro.advance(50)                   # time never moves backwards
+        self.assertEqual(macro.now, 100)
+        macro.import_raw('a', 85)
+        macro.import_raw('b', 79.9)
+        self.assertEqual(macro.late, 1)
+        self.assertEqual(macro.get_series('clean', 'a'),
+                         [ (80, 1), (100, 2) ])
+        self.assertEqual(macro.get_series('clean', 'b'),
+                         [ (80, 0), (100, 1) ])
+
+    def test_not_mergeable(self):
+        macro = windowed()
+        self.assertRaises(TypeError, macro.merge, windowed())
+        self.assertRaises(TypeError, macro.load, 'index')
+
+
+if __name__ == '__main__':
+    unittest.main()